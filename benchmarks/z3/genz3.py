@@ -1,138 +1,157 @@
-from z3 import *
-import itertools
-from sets import Set
-
-land = []
-lor = []
-neg = []
-issat = []
-isvalid = []
-#
-
-threshold = 1000
-depth = 4
-
-def f_sat(a):
-    s = Solver()
-    s.add(a)
-    return s.check() != unsat
-
-vc = 0
-def f_valid(a):
-    global vc
-    vc = vc + 1
-    print vc
-    
-    s = Solver()
-    s.add(a)
-    if s.check() == unsat:
-        return False
-    s.reset()
-    s.add(Not(a))
-    if s.check() == sat:
-        return False
-    return True
-
-
-x = Bool('x')
-y = Bool('y')
-z = Bool('z')
-m = {}
-m[0] = [x,y,z,True,False]
-maxi = 0
-def generateForms():
-    global maxi
-    
-    for i in range(1,depth):
-        m[i] = []
-        if i > maxi : maxi = i
-        for a in m[i-1]:
-            neg.append((a,Not(a)))
-            m[i].append(Not(a))
-            
-            issat.append((a,f_sat(a)))
-            isvalid.append((a, f_valid(a)))
-
-        for (a,b) in itertools.product(m[i-1], repeat=2): 
-            if len(land) > threshold: return
-            print "len: ", len(land)
-            conj = And(a,b)
-            disj = Or(a,b)
-            
-            land.append((a,b,conj))
-            lor.append((a,b,disj))
-
-            m[i].append(conj)
-            m[i].append(disj)
-
-def tab(t):
-    tp = map(lambda x: str(x), t)
-    return "\t".join(tp)
-
-def toFile(name, l):
-    f = open("./facts/"+name+".facts", 'w')
-    for t in l:
-        #print tab(t)
-        f.write(tab(t)+"\n")
-
-generateForms()
-
-
-print len(neg)
-print len(land)
-print len(lor)
-print len(issat)
-print len(isvalid)
-            
-allforms = []
-for i in range(0,maxi+1):
-    for a in m[i]:
-        allforms.append(a)
-
-
-eq = {}
-h = {}
-count = 0
-
-def ineq(f,e):
-    if f_valid (f == e[0]):
-        return True
-
-    return False
-
-count = 0
-num = 1
-for f in allforms:
-    found = False
-    for i in eq:
-        if ineq(f,eq[i]):
-            eq[i].append(f)
-            h[f] = i
-            found = True
+from itertools import product
+import argparse
+import os
+
+# ----------------------------------------
+# truth tables
+# ----------------------------------------
+# a formula over n variables is known by its truth table, packed into an int
+# whose bit i is its value when the variables are the bits of i, the first
+# variable highest. formulas with equal tables are equivalent, and the table
+# of a compound formula is a bit operation on the tables of its parts
+
+def variable_tables(names):
+    n = len(names)
+    tables = {}
+    for k, name in enumerate(names):
+        bit = n - 1 - k
+        tables[name] = sum(1 << i for i in range(1 << n) if (i >> bit) & 1)
+    return tables
+
+# ----------------------------------------
+# enumeration
+# ----------------------------------------
+# formulas are built bottom up, level by level, where a level is a depth or
+# a size. only one formula per table is ever kept - the first one found - so
+# every later level combines classes rather than formulas, and each pair of
+# classes is combined exactly once: at the level just above the higher of
+# the two (by depth), or at the sum of their sizes plus one (by size)
+
+class Enumerator(object):
+    def __init__(self, names, by="depth"):
+        self.by = by
+        self.full = (1 << (1 << len(names))) - 1
+        self.ids = {}
+        self.tables = []
+        self.formulas = []
+        self.levels = []
+        self.pending = []
+        leaves = [(name, table) for name, table in variable_tables(names).items()]
+        leaves += [("True", self.full), ("False", 0)]
+        self.levels.append([])
+        for formula, table in leaves:
+            self.intern(table, formula, 0)
+
+    # the id of a table's class, starting a new one in level if it is unseen
+    def intern(self, table, formula, level):
+        if table not in self.ids:
+            self.ids[table] = len(self.tables) + 1
+            self.tables.append(table)
+            self.formulas.append(formula)
+            self.levels[level].append(self.ids[table])
+            self.pending.append(self.ids[table])
+        return self.ids[table]
+
+    def table(self, i):
+        return self.tables[i - 1]
+
+    def formula(self, i):
+        return self.formulas[i - 1]
+
+    # the pairs of classes first combined at a level
+    def _pairs(self, level):
+        if self.by == "depth":
+            below = [i for l in self.levels[:level - 1] for i in l]
+            last = self.levels[level - 1]
+            fresh = set(last)
+            for a, b in product(below + last, repeat=2):
+                if a in fresh or b in fresh:
+                    yield a, b
+        else:
+            for k in range(1, level):
+                for a, b in product(self.levels[k - 1], self.levels[level - 1 - k]):
+                    yield a, b
+
+    # sat and valid for the classes found since the last call
+    def new_facts(self):
+        for i in self.pending:
+            yield "sat", (i, self.table(i) != 0)
+            yield "valid", (i, self.table(i) == self.full)
+        self.pending = []
+
+    # the facts of the next level, as (relation, row) pairs
+    def step(self):
+        level = len(self.levels)
+        self.levels.append([])
+        for a in self.levels[level - 1]:
+            yield "neg", (a, self.intern(self.full & ~self.table(a),
+                                         "Not({})".format(self.formula(a)), level))
+            yield from self.new_facts()
+        for a, b in self._pairs(level):
+            ta, tb = self.table(a), self.table(b)
+            fa, fb = self.formula(a), self.formula(b)
+            yield "and", (a, b, self.intern(ta & tb, "And({}, {})".format(fa, fb), level))
+            yield "or", (a, b, self.intern(ta | tb, "Or({}, {})".format(fa, fb), level))
+            yield from self.new_facts()
+
+# ----------------------------------------
+# writing facts
+# ----------------------------------------
+# rows go out as they are found and every level is flushed, so the files
+# are usable while a long run is still going
+
+RELATIONS = ["and", "or", "neg", "sat", "valid"]
+
+class FactWriter(object):
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.files = dict((r, open(os.path.join(folder, r + ".facts"), "w")) for r in RELATIONS)
+        self.counts = dict.fromkeys(RELATIONS, 0)
+    def write(self, relation, row):
+        self.files[relation].write("\t".join(map(str, row)) + "\n")
+        self.counts[relation] += 1
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generates boolean formula facts")
+    parser.add_argument('-o', '--output', default="./facts")
+    parser.add_argument('-v', '--variables', nargs='+', default=["x", "y", "z"])
+    parser.add_argument('-b', '--by', choices=["depth", "size"], default="depth",
+        help="grow formulas a level of depth or a node of size at a time")
+    parser.add_argument('-d', '--depth', type=int, default=4,
+        help="levels to build, leaves included")
+    parser.add_argument('-t', '--threshold', type=int, default=0,
+        help="stop after this many and facts, 0 for no limit")
+    parser.add_argument('-p', '--print', action="store_true",
+        help="print a formula for every class")
+    args = parser.parse_args()
+
+    enum = Enumerator(args.variables, args.by)
+    out = FactWriter(args.output)
+    for relation, row in enum.new_facts():
+        out.write(relation, row)
+    done = False
+    for level in range(1, args.depth):
+        for relation, row in enum.step():
+            # stop between pairs, so each and row has its or row and the
+            # classes it mentions have their sat and valid rows
+            if relation == "and" and args.threshold and out.counts["and"] >= args.threshold:
+                done = True
+                break
+            out.write(relation, row)
+        out.flush()
+        print("{} {}: {} classes, {}".format(args.by, level, len(enum.tables),
+            ", ".join("{} {}".format(out.counts[r], r) for r in RELATIONS)))
+        # nothing new means the next level has nothing to combine
+        if done or (args.by == "depth" and not enum.levels[level]):
             break
+    out.close()
 
-    if found == False:
-        count = count + 1
-        eq[count] = [f]
-        h[f] = count
-
-print eq
-#print h
-
-land = map(lambda (a,b,c): (h[a],h[b],h[c]), land)
-lor = map(lambda (a,b,c): (h[a],h[b],h[c]), lor)
-neg = map(lambda (a,b): (h[a],h[b]), neg)
-issat = map(lambda (a,b): (h[a],b), issat)
-isvalid = map(lambda (a,b): (h[a],b), isvalid)
-
-#print land
-#print lor
-#print neg
-#print issat
-#print isvalid
-
-toFile("and",land)
-toFile("or",lor)
-toFile("neg",neg)
-toFile("sat",issat)
-toFile("valid",isvalid)
+    if args.print:
+        for i in range(1, len(enum.tables) + 1):
+            print("{}\t{:0{}b}\t{}".format(i, enum.table(i), 1 << len(args.variables), enum.formula(i)))
@@ -24,6 +24,7 @@ let sample_count = ref 0
 let interval_start = ref 0
 let interval_end = ref 10000
 let interval_exclude = ref false
+let seed = ref (-1)
 
 let unique_id = ref ""
 
@@ -44,6 +45,7 @@ let spec_list = [
         " Selects/blocks a range of values.");
     ("-exclude", Arg.Set interval_exclude, " Turns interval selection to exclusion.");
     ("-sample", Arg.Set_int sample_count, " Samples k values from the chosen interval.");
+    ("-seed", Arg.Set_int seed, " Seeds the sampler, for repeatable runs.");
     ("-csv", Arg.Set csv_flag, " Enables tab-separated output.");
     ("-maxdepth", Arg.Set_int maxdepth, " Maximum size of specs.");
     ("-id", Arg.Set_string unique_id, " So Aws can stop breaking everything.");
@@ -221,7 +223,7 @@ let _ =
     (* parse command line options *)
     Arg.parse (Arg.align spec_list) anon_fun usage_msg;
     (* initialize rng *)
-    Random.self_init ();
+    if !seed >= 0 then Random.init !seed else Random.self_init ();
     (* and our working directory *)
     (* load config options *)
     parse_work_file "config.sexp" !unique_id;
@@ -1,58 +1,31 @@
-from subprocess import STDOUT, check_output, TimeoutExpired
+from subprocess import STDOUT, PIPE, Popen
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Thread
+from queue import Queue, Empty
+from bisect import bisect_left
+from time import monotonic
+from typing import NamedTuple
 import argparse
-import sys
-import csv
+import tempfile
+import shlex
+import hashlib
+import json
+import os
 from itertools import combinations
 
+from common import read_sexp, write_sexp, Result, parse_result, iter_times, remove_work_dir
+from specs import spec_key, rank
 
-# ----------------------------------------
-# utility functions
-# ----------------------------------------
 
-def from_sexp(string):
-    sexp = [[]]
-    word = ''
-    in_str = False
-    for char in string:
-        if char == '(' and not in_str:
-            sexp.append([])
-        elif char == ')' and not in_str:
-            if word:
-                sexp[-1].append(word)
-                word = ''
-            temp = sexp.pop()
-            sexp[-1].append(temp)
-        elif char in (' ', '\n', '\t') and not in_str:
-            if word:
-                sexp[-1].append(word)
-                word = ''
-        elif char == '\"':
-            in_str = not in_str
-        else:
-            word += char
-    return sexp[0][0]
-
-def to_sexp(li):
-    if not isinstance(li, list):
-        return str(li)
-    else:
-        return "({})".format(" ".join(map(to_sexp, li)))
-
-def do_it(cmd, seconds):
-    try:
-         output = check_output(cmd, stderr=STDOUT, timeout=seconds, shell=True)
-         return output.decode(sys.stdout.encoding)
-    except TimeoutExpired as e:
-        return e.output.decode(sys.stdout.encoding)
 # ----------------------------------------
 # wrapper for config files
 # ----------------------------------------
 
 class ConfigFile(object):
     def __init__(self, s):
-        self._rep = from_sexp(s)
+        self._rep = read_sexp(s)
     def __repr__(self):
-        return to_sexp(self._rep)
+        return write_sexp(self._rep)
     def signature(self):
         return list(filter(lambda x: x[0] == "signature", self._rep))[0][1:][0]
     def update_signature(self, s):
@@ -72,50 +45,250 @@ def split_signature(sexpr, k=2):
 # ----------------------------------------
 # and a wrapper for the results
 # ----------------------------------------
-class Results(object):
-    def __init__(self, line):
-        self._line = line
-        items = line.split("\t")
-        self.formula = items[0]
-        self.positive_evidence = int(items[1])
-        self.size = int(items[2])
-        self.num_vars = int(items[3])
-        self.num_holes = int(items[4])
-        self.abducible_size = int(items[5])
-    def score(self):
-        return self.positive_evidence / self.size
-    def __repr__(self):
-        ret = [self.formula, self.positive_evidence, self.size, self.num_vars, self.num_holes, self.abducible_size]
-        ret = map(lambda x: str(x), ret)
-        return '\t'.join(ret)
-
-def gather_results(output):
-    out = []
-    lines = list(set(output.split("\n")))
-    for line in lines:
+# results parsed as lines arrive, with the top k by score kept in order and
+# the time the top k last changed
+class Ranking(object):
+    def __init__(self, k=0):
+        self._k = k
+        self._results = {}
+        self._order = []
+        self.changed = monotonic()
+    def add(self, line):
+        result = parse_result(line)
+        if result is None:
+            return
+        key = result.line()
+        if key in self._results:
+            return
+        self._results[key] = result
+        entry = (-result.score(), key)
+        pos = bisect_left(self._order, entry)
+        self._order.insert(pos, entry)
+        if self._k and pos < self._k:
+            self.changed = monotonic()
+    def top(self):
+        return [self._results[key] for _, key in self._order[:self._k]]
+    def full(self):
+        return self._k > 0 and len(self._order) >= self._k
+    def results(self):
+        return list(self._results.values())
+
+# what a single run produced, whether it ran to completion, how long it took
+# and how many souffle checks it got through according to -times
+class Outcome(NamedTuple):
+    results: list
+    complete: bool
+    elapsed: float
+    checks: int
+
+# runs cmd and parses its output as it streams in - gives up after seconds,
+# or once the top k results have not changed for window seconds
+def stream_it(cmd, seconds, k=0, window=0):
+    proc = Popen(shlex.split(cmd), stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+    lines = Queue()
+    def pump():
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)
+    Thread(target=pump, daemon=True).start()
+
+    ranking = Ranking(k)
+    started = monotonic()
+    deadline = started + seconds
+    complete = False
+    checks = 0
+    while True:
+        now = monotonic()
+        stable = window > 0 and ranking.full() and now - ranking.changed >= window
+        if now >= deadline or stable:
+            break
+        wait = deadline - now
+        if window > 0 and ranking.full():
+            wait = min(wait, ranking.changed + window - now)
         try:
-            out.append(Results(line))
-        except:
+            line = lines.get(timeout=wait)
+        except Empty:
+            continue
+        if line is None:
+            complete = True
+            break
+        for _, checks in iter_times([line]):
             pass
-    return out
+        ranking.add(line)
+    if not complete:
+        proc.kill()
+    proc.wait()
+    return Outcome(ranking.results(), complete, monotonic() - started, checks)
+
+# ----------------------------------------
+# an on-disk cache of combination results
+# ----------------------------------------
+# entries are keyed on the sub-signature, the fact files it reads, the depth
+# and the abduce flag - a run cut off by its timeout is only reused when the
+# new timeout is no longer
+class ResultCache(object):
+    def __init__(self, folder):
+        self._folder = folder
+        os.makedirs(folder, exist_ok=True)
+    def key(self, sexp, fact_dir, depth, abduce, stop=(0, 0)):
+        h = hashlib.sha256()
+        h.update(sexp.encode())
+        for symbol in ConfigFile(sexp).signature():
+            filename = os.path.join(fact_dir, "{}.facts".format(symbol[1]))
+            try:
+                with open(filename, "rb") as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+            except OSError:
+                h.update(b"missing")
+        h.update(repr((depth, bool(abduce), tuple(stop))).encode())
+        return h.hexdigest()
+    def get(self, key, time):
+        try:
+            with open(os.path.join(self._folder, key + ".json")) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["complete"] or entry["timeout"] >= time:
+            try:
+                results = [Result(r[0], *map(int, r[1:])) for r in entry["results"]]
+                return Outcome(results, entry["complete"], entry["elapsed"], entry["checks"])
+            except (KeyError, TypeError, ValueError):
+                return None
+        return None
+    def put(self, key, time, outcome):
+        entry = {"timeout": time, "complete": outcome.complete,
+                 "elapsed": outcome.elapsed, "checks": outcome.checks,
+                 "results": [list(r) for r in outcome.results]}
+        # write then rename, so parallel workers never see half an entry
+        filename = os.path.join(self._folder, key + ".json")
+        with open(filename + ".{}".format(os.getpid()), "w") as f:
+            json.dump(entry, f)
+        os.replace(filename + ".{}".format(os.getpid()), filename)
 
 # ----------------------------------------
 # now we do the fun stuff
 # ----------------------------------------
-CMD = "./bach.native -induct /tmp/tmp{depth}.sexp -fact {fact_dir} -mindepth {depth} -csv -id {depth}"
+CMD = "./bach.native -induct {config} -fact {fact_dir} -mindepth {depth} -csv -times -id {id}"
 
-def bach(config, fact_dir, depth, time, abduce):
-    cmd = CMD.format(fact_dir=fact_dir, depth=depth)
+# every combination gets a private config file and work directory, so any
+# number of them can run side by side, and both go once it is done
+def run_combination(sexp, fact_dir, depth, time, abduce, index, cache=None, stop=(0, 0)):
+    if cache:
+        key = cache.key(sexp, fact_dir, depth, abduce, stop)
+        cached = cache.get(key, time)
+        if cached is not None:
+            return cached
+    with tempfile.NamedTemporaryFile("w", suffix=".sexp", delete=False) as f:
+        f.write(sexp)
+    uid = "{}_{}_{}".format(depth, os.getpid(), index)
+    cmd = CMD.format(config=f.name, fact_dir=fact_dir, depth=depth, id=uid)
     if abduce:
         cmd += " -abduce"
+    try:
+        outcome = stream_it(cmd, time, *stop)
+    finally:
+        os.remove(f.name)
+        remove_work_dir(uid)
+    if cache:
+        cache.put(key, time, outcome)
+    return outcome
+
+# ----------------------------------------
+# spending a total time budget
+# ----------------------------------------
+# every combination first gets a short probe - the ones that finish are done,
+# and the rest are rerun in rounds, sharing what is left of the budget in
+# proportion to the new specs they found per second and at least doubling
+# their last timeout. a rerun that finds nothing new after earlier ones found
+# something, or whose -times count shows no more souffle checks than before,
+# drops the combination; one that has found nothing yet is only starting up,
+# so it stays in with a longer timeout. once every combination is dropped,
+# the unfinished ones share whatever budget is left
+PROBE_SHARE = 0.1
+
+def schedule(combos, budget, jobs, run, merge, probe=0):
+    deadline = monotonic() + budget
+    waves = -(-len(combos) // jobs)
+    timeouts = dict.fromkeys(range(len(combos)), probe or budget * PROBE_SHARE / max(waves, 1))
+    last = dict.fromkeys(range(len(combos)), 0.0)
+    seen = dict((i, set()) for i in range(len(combos)))
+    checks = dict.fromkeys(range(len(combos)), 0)
+    rates = dict.fromkeys(range(len(combos)), 0.0)
+    unfinished = set(range(len(combos)))
+    active = set(unfinished)
+    # runs queued behind others must still stop at the deadline
+    def start(i):
+        timeout = min(timeouts[i], deadline - monotonic())
+        if timeout <= 0:
+            return Outcome([], False, 0.0, 0)
+        last[i] = timeout
+        return run(combos[i], i, timeout)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while active:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            # the most productive combinations go first
+            order = sorted(active, key=lambda i: (-rates[i], i))
+            futures = dict((pool.submit(start, i), i) for i in order)
+            for future in as_completed(futures):
+                i = futures[future]
+                outcome = future.result()
+                merge(outcome.results)
+                if outcome.complete:
+                    unfinished.discard(i)
+                    active.discard(i)
+                    continue
+                new = set(spec_key(r.formula) for r in outcome.results) - seen[i]
+                seen[i] |= new
+                stalled = outcome.checks and outcome.checks <= checks[i]
+                checks[i] = max(checks[i], outcome.checks)
+                if stalled or (seen[i] and not new):
+                    active.discard(i)
+                elif new:
+                    rates[i] = len(new) / max(outcome.elapsed, 1e-3)
+            if not active:
+                active = set(unfinished)
+            remaining = deadline - monotonic()
+            total = sum(rates[i] for i in active)
+            for i in list(active):
+                share = remaining * jobs * rates[i] / total if total else remaining
+                timeouts[i] = min(max(2 * timeouts[i], share), remaining)
+                # a rerun with no more time than the last one only repeats it
+                if timeouts[i] <= last[i]:
+                    unfinished.discard(i)
+                    active.discard(i)
+
+# stop is a (k, window) pair - a combination ends early once its top k results
+# have been stable for window seconds, (0, 0) runs each one to the timeout
+# with a budget, time is ignored and schedule decides every timeout
+def bach(config, fact_dir, depth, time, abduce, jobs=1, cache=None, stop=(0, 0), budget=0):
     with open(config) as f:
         signature = f.read()
-    result_strings = []
-    for sexp in split_signature(signature):
-        with open("/tmp/tmp"+str(depth)+".sexp", "w") as f:
-            f.write(sexp)
-        result_strings.append(do_it(cmd, time))
-    return gather_results("\n".join(result_strings))
+    combos = list(split_signature(signature))
+    # specs that differ only by renaming, found by different combinations,
+    # are merged as they finish
+    results = {}
+    def merge(found):
+        for result in found:
+            key = spec_key(result.formula)
+            if key not in results or rank(result) < rank(results[key]):
+                results[key] = result
+    if budget > 0:
+        def run(sexp, i, timeout):
+            return run_combination(sexp, fact_dir, depth, timeout, abduce, i, cache, stop)
+        schedule(combos, budget, jobs, run, merge)
+    elif jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(run_combination, sexp, fact_dir, depth, time, abduce, i,
+                                   cache, stop)
+                       for i, sexp in enumerate(combos)]
+            for future in as_completed(futures):
+                merge(future.result().results)
+    else:
+        for i, sexp in enumerate(combos):
+            merge(run_combination(sexp, fact_dir, depth, time, abduce, i, cache, stop).results)
+    return list(results.values())
 
 # ----------------------------------------
 # and make it all work
@@ -128,10 +301,22 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--timeout", default=1000)
     parser.add_argument("-d", "--depth", default=0)
     parser.add_argument("-a", "--abduce", default=False)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-c", "--cache", default=".bach_cache",
+        help="folder for cached combination results")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("-k", "--top", type=int, default=0,
+        help="stop a combination once its top k results are stable")
+    parser.add_argument("-w", "--window", type=float, default=0,
+        help="seconds the top k must stay unchanged")
+    parser.add_argument("-b", "--budget", type=float, default=0,
+        help="total seconds to share out between combinations, overrides --timeout")
 
     args = parser.parse_args()
 
-    results = bach(args.grammar, args.facts, args.depth, float(args.timeout), args.abduce)
+    cache = None if args.no_cache else ResultCache(args.cache)
+    results = bach(args.grammar, args.facts, args.depth, float(args.timeout), args.abduce,
+                   args.jobs, cache, (args.top, args.window), args.budget)
 
-    for result in sorted(results, key=lambda r: r.score(), reverse=True):
-        print(repr(result))
+    for result in sorted(results, key=lambda r: (-r.score(), r.line())):
+        print(result.line())
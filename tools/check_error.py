@@ -1,30 +1,23 @@
-from subprocess import STDOUT, check_output, TimeoutExpired
+from subprocess import STDOUT, PIPE, run, TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from zlib import crc32
 import argparse
+import shlex
 import sys
-import csv
+import os
 
-def load_gt(filename):
-    with open(filename) as f:
-        return set(line.split("\t")[0] for line in f.readlines())
+from common import read_formulas, iter_results, remove_work_dir
+from specs import spec_key
 
 def do_it(cmd, seconds):
     try:
-         output = check_output(cmd, stderr=STDOUT, timeout=seconds, shell=True)
-         return output.decode(sys.stdout.encoding)
+        output = run(shlex.split(cmd), stdout=PIPE, stderr=STDOUT, timeout=seconds).stdout
     except TimeoutExpired as e:
-        return e.output.decode(sys.stdout.encoding)
+        output = e.output or b""
+    return output.decode(sys.stdout.encoding)
 
 def grab_results(results):
-    out = []
-    for line in results.split("\n"):
-        if line:
-            try:
-                out.append(line.split("\t")[0])
-            except:
-                pass
-        else:
-            pass
-    return set(out)
+    return set(spec_key(r.formula) for r in iter_results(results.split("\n")))
 
 def error_analysis(observations, ground):
     # compute t1 error (false positives) and t2 error (true negatives)
@@ -32,23 +25,57 @@ def error_analysis(observations, ground):
     tn_count = len(ground - observations)
     return fp_count, tn_count, len(observations)
 
+# every run gets its own seed, fixed by the base seed, benchmark, size and
+# repeat, so any one of them can be rerun on its own with the same sample
+def run_seed(seed, benchmark, size, repeat):
+    key = "{}:{}:{}:{}".format(seed, benchmark, size, repeat)
+    return crc32(key.encode()) & 0x3fffffff
+
+# runs share a working directory unless their ids differ, and each one's
+# is removed once it is done
+CMD = "./bach.native -csv -b {benchmark} -interval {interval[0]} {interval[1]} -maxdepth {depth} " \
+      "-sample {size} -seed {seed} -id {id}"
+
+def check(args, ground, size, repeat):
+    seed = run_seed(args.seed, args.benchmark, size, repeat)
+    uid = "err_{}_{}_{}".format(os.getpid(), size, repeat)
+    cmd = CMD.format(benchmark=args.benchmark, interval=args.interval, depth=args.depth,
+                     size=size, seed=seed, id=uid)
+    try:
+        data = do_it(cmd, args.timeout)
+    finally:
+        remove_work_dir(uid)
+    return size, repeat, seed, error_analysis(grab_results(data), ground)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="When this baby gets up to 88MPH...")
     parser.add_argument('-t', '--timeout', type=int, default=1000)
     parser.add_argument('-g', '--ground', required=True)
-    parser.add_argument('-s', '--size', type=int, required=True)
+    parser.add_argument('-s', '--size', type=int, nargs='+', required=True)
     parser.add_argument('-i', '--interval', type=int, nargs=2, required=True)
     parser.add_argument('-r', '--repeat', type=int, default=10)
     parser.add_argument('-d', '--depth', type=int, default=10)
     parser.add_argument('-b', '--benchmark', required=True)
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0,
+        help="base seed every run's sampling seed is drawn from")
 
     args = parser.parse_args()
 
-    cmd = "./bach.native -csv -b {benchmark} -interval {interval[0]} {interval[1]} -maxdepth {depth} -sample {size}"
-
-    ground = load_gt(args.ground)
+    ground = set(map(spec_key, read_formulas(args.ground)))
 
-    for i in range(args.repeat):
-        data = do_it(cmd.format(**args.__dict__), args.timeout)
-        results = grab_results(data)
-        print(error_analysis(results, ground))
+    # each run prints "run size repeat seed fp fn count" as it finishes, and
+    # once every repeat of a size is in, "size size runs fp fn count" with
+    # the means over those repeats
+    sizes = list(dict.fromkeys(args.size))
+    done = dict((size, []) for size in sizes)
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(check, args, ground, size, repeat)
+                   for size in sizes for repeat in range(args.repeat)]
+        for future in as_completed(futures):
+            size, repeat, seed, errors = future.result()
+            print("run", size, repeat, seed, *errors, sep="\t", flush=True)
+            done[size].append(errors)
+            if len(done[size]) == args.repeat:
+                means = ["{:.2f}".format(sum(col) / args.repeat) for col in zip(*done[size])]
+                print("size", size, args.repeat, *means, sep="\t", flush=True)
@@ -0,0 +1,140 @@
+from typing import NamedTuple
+import shutil
+import re
+import os
+
+# ----------------------------------------
+# s-expressions
+# ----------------------------------------
+# atoms come back as strings and lists as lists - quoted atoms lose their
+# quotes, as in the config and grammar files nothing relies on them
+
+_TOKENS = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+def read_sexp(string):
+    stack = [[]]
+    pos = 0
+    end = len(string.rstrip())
+    while pos < end:
+        match = _TOKENS.match(string, pos)
+        if not match:
+            raise ValueError("bad s-expression at {}".format(pos))
+        pos = match.end()
+        opened, closed, quoted, atom = match.groups()
+        if opened:
+            stack.append([])
+        elif closed:
+            if len(stack) < 2:
+                raise ValueError("unbalanced ')' at {}".format(pos))
+            done = stack.pop()
+            stack[-1].append(done)
+        else:
+            stack[-1].append(atom if atom is not None else quoted)
+    if len(stack) != 1 or not stack[0]:
+        raise ValueError("unbalanced s-expression")
+    return stack[0][0]
+
+def write_sexp(sexp):
+    if isinstance(sexp, list):
+        return "({})".format(" ".join(map(write_sexp, sexp)))
+    atom = str(sexp)
+    if not atom or re.search(r'[\s()"]', atom):
+        return '"{}"'.format(atom.replace('\\', '\\\\').replace('"', '\\"'))
+    return atom
+
+# ----------------------------------------
+# result rows
+# ----------------------------------------
+# bach.native -csv prints one tab-separated row per spec
+
+class Result(NamedTuple):
+    formula: str
+    positive_evidence: int
+    size: int
+    num_vars: int
+    num_holes: int
+    abducible_size: int
+
+    def score(self):
+        return self.positive_evidence / self.size
+    def line(self):
+        return "\t".join(map(str, self))
+
+# None for anything that is not a well-formed row
+def parse_result(line):
+    items = line.rstrip("\r\n").split("\t")
+    if len(items) != 6:
+        return None
+    try:
+        return Result(items[0], *map(int, items[1:]))
+    except ValueError:
+        return None
+
+def iter_results(lines):
+    for line in lines:
+        result = parse_result(line)
+        if result is not None:
+            yield result
+
+def read_results(filename):
+    with open(filename) as f:
+        yield from iter_results(f)
+
+# just the formulas, which is all the error analysis compares
+def read_formulas(filename):
+    return set(r.formula for r in read_results(filename))
+
+# bach.native -times prints "TIME:" rows with the elapsed time and the
+# number of souffle calls so far
+def iter_times(lines):
+    for line in lines:
+        if line.startswith("TIME"):
+            items = line.rstrip("\r\n").split("\t")
+            yield float(items[1]), int(items[2])
+
+# ----------------------------------------
+# work directories
+# ----------------------------------------
+# bach.native -id <id> works in <work_dir><id>/, with work_dir taken from
+# the config.sexp where it runs, and leaves the folder behind when it exits
+
+def work_dir(uid, config="config.sexp"):
+    base = "/tmp/"
+    try:
+        with open(config) as f:
+            for entry in read_sexp(f.read()):
+                if isinstance(entry, list) and len(entry) > 1 and entry[0] == "work_dir":
+                    base = entry[1]
+    except (OSError, ValueError):
+        pass
+    return base + uid + "/"
+
+def remove_work_dir(uid, config="config.sexp"):
+    # without an id bach.native works in work_dir itself, which is shared
+    if uid:
+        shutil.rmtree(work_dir(uid, config), ignore_errors=True)
+
+# ----------------------------------------
+# sweep results
+# ----------------------------------------
+# fse_test.sh writes <bm>_<size>_<iter>.csv and fse_truth.sh <bm>_truth.csv
+
+_RUN = re.compile(r"^(?P<bm>.+)_(?P<size>\d+)_(?P<iter>\d+)\.csv$")
+
+class Run(NamedTuple):
+    bm: str
+    size: int
+    iter: int
+    filename: str
+
+def find_runs(folder, bm=None):
+    runs = []
+    for name in os.listdir(folder):
+        match = _RUN.match(name)
+        if match and (bm is None or match.group("bm") == bm):
+            runs.append(Run(match.group("bm"), int(match.group("size")),
+                            int(match.group("iter")), os.path.join(folder, name)))
+    return sorted(runs)
+
+def truth_file(folder, bm):
+    return os.path.join(folder, "{}_truth.csv".format(bm))
@@ -0,0 +1,148 @@
+from argparse import ArgumentParser
+from csv import reader, writer
+import json
+import re
+import os
+
+import numpy as np
+
+# a columnar store keeps a folder of facts as
+#   index.json               function -> sort of each column
+#   <sort>.offsets.npy       int64 offsets into the blob, one per value + 1
+#   <sort>.values.bin        the utf-8 text of every distinct value of the sort
+#   <function>.rows.npy      int32 matrix of value ids, one row per fact
+# everything but the index is loaded with mmap, so opening a store is cheap
+INDEX = "index.json"
+
+# sorts for each symbol, pulled out of a grammar's signature
+def grammar_sorts(filename):
+    with open(filename) as f:
+        text = f.read()
+    symbols = re.findall(r"\(Symbol\s+(\S+)\s+\(([^)]*)\)\)", text)
+    return {name: sorts.split() for name, sorts in symbols}
+
+def read_text(folder, delimiter="\t"):
+    tables = {}
+    for filename in sorted(os.listdir(folder)):
+        name, ext = os.path.splitext(filename)
+        if ext == ".facts":
+            with open(os.path.join(folder, filename), newline='') as f:
+                tables[name] = [row for row in reader(f, delimiter=delimiter)]
+    return tables
+
+def write_text(folder, tables, delimiter="\t"):
+    os.makedirs(folder, exist_ok=True)
+    for name, rows in tables.items():
+        with open(os.path.join(folder, "{}.facts".format(name)), 'w', newline='') as f:
+            writer(f, delimiter=delimiter).writerows(rows)
+
+# tables maps function names to rows of strings, sorts maps them to the sort
+# of every column - columns without a known sort get one of their own
+def write_store(folder, tables, sorts=None):
+    os.makedirs(folder, exist_ok=True)
+    index = {}
+    for name, rows in tables.items():
+        known = (sorts or {}).get(name, [])
+        width = len(rows[0]) if rows else len(known)
+        index[name] = known if len(known) == width else \
+            ["{}.{}".format(name, i) for i in range(width)]
+
+    values = {}
+    for name, rows in tables.items():
+        for sort, column in zip(index[name], zip(*rows)):
+            values.setdefault(sort, set()).update(column)
+    ids = {}
+    for sort, vs in values.items():
+        ordered = sorted(vs)
+        ids[sort] = {v: i for i, v in enumerate(ordered)}
+        encoded = [v.encode() for v in ordered]
+        offsets = np.cumsum([0] + [len(e) for e in encoded], dtype=np.int64)
+        np.save(os.path.join(folder, "{}.offsets.npy".format(sort)), offsets)
+        with open(os.path.join(folder, "{}.values.bin".format(sort)), 'wb') as f:
+            f.write(b"".join(encoded))
+
+    for name, rows in tables.items():
+        lookups = [ids[sort] for sort in index[name]]
+        matrix = np.array([[l[v] for l, v in zip(lookups, row)] for row in rows],
+                          dtype=np.int32).reshape(len(rows), len(index[name]))
+        np.save(os.path.join(folder, "{}.rows.npy".format(name)), matrix)
+
+    with open(os.path.join(folder, INDEX), 'w') as f:
+        json.dump(index, f, indent=4, sort_keys=True)
+
+# the strings of one sort, decoded on demand from the mapped blob
+class Dictionary(object):
+    def __init__(self, folder, sort):
+        self._offsets = np.load(os.path.join(folder, "{}.offsets.npy".format(sort)), mmap_mode='r')
+        filename = os.path.join(folder, "{}.values.bin".format(sort))
+        if os.path.getsize(filename):
+            self._blob = np.memmap(filename, dtype=np.uint8, mode='r')
+        else:
+            self._blob = np.zeros(0, dtype=np.uint8)
+    def __len__(self):
+        return len(self._offsets) - 1
+    def __getitem__(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode()
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+    # values are stored sorted, so finding an id is a binary search
+    def lookup(self, value):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self[lo] == value:
+            return lo
+        raise KeyError(value)
+
+class Store(object):
+    def __init__(self, folder):
+        self._folder = folder
+        with open(os.path.join(folder, INDEX)) as f:
+            self._index = json.load(f)
+        self._dictionaries = {}
+        self._rows = {}
+    def functions(self):
+        return list(self._index)
+    def sorts(self, name):
+        return self._index[name]
+    def dictionary(self, sort):
+        if sort not in self._dictionaries:
+            self._dictionaries[sort] = Dictionary(self._folder, sort)
+        return self._dictionaries[sort]
+    # the id matrix for a function, rows x columns
+    def rows(self, name):
+        if name not in self._rows:
+            filename = os.path.join(self._folder, "{}.rows.npy".format(name))
+            self._rows[name] = np.load(filename, mmap_mode='r')
+        return self._rows[name]
+    def decode(self, name, rows=None):
+        ids = self.rows(name) if rows is None else self.rows(name)[rows]
+        dictionaries = [self.dictionary(sort) for sort in self.sorts(name)]
+        return [[d[i] for d, i in zip(dictionaries, row)] for row in ids.tolist()]
+    def tables(self):
+        return {name: self.decode(name) for name in self.functions()}
+
+def to_store(text_folder, store_folder, grammar=None, delimiter="\t"):
+    sorts = grammar_sorts(grammar) if grammar else {}
+    write_store(store_folder, read_text(text_folder, delimiter), sorts)
+
+def to_text(store_folder, text_folder, delimiter="\t"):
+    write_text(text_folder, Store(store_folder).tables(), delimiter)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="converts between text and columnar fact files")
+    parser.add_argument('direction', choices=["to-store", "to-text"])
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('-g', '--grammar', help="grammar whose signature names the sorts")
+    parser.add_argument('-d', '--delimiter', type=str, default="\t")
+    args = parser.parse_args()
+
+    if args.direction == "to-store":
+        to_store(args.source, args.target, args.grammar, args.delimiter)
+    else:
+        to_text(args.source, args.target, args.delimiter)
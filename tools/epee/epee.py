@@ -1,7 +1,19 @@
 from argparse import ArgumentParser
-from inspect import signature
+from inspect import signature, getsource, isfunction
 from importlib import machinery
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product, combinations
+from collections import OrderedDict
+from pickle import PicklingError
+from time import perf_counter, process_time
+import multiprocessing
+from copy import deepcopy
 from csv import writer
+from zlib import crc32
+import hashlib
+import random
+import json
 import os
 
 # store generators in a map, use decorator to tag them
@@ -17,6 +29,71 @@ def add_generator(key):
 def generate(*args):
     return [next(_GENERATORS[arg]) for arg in args]
 
+# batch generators take a count n and return a list of n values at once
+# label them with add_batch_generator - keys without one fall back to the
+# scalar generator above
+_BATCH_GENERATORS = {}
+
+def add_batch_generator(key):
+    def deco(f):
+        _BATCH_GENERATORS[key] = f
+        return f
+    return deco
+
+def generate_batch(n, *args):
+    columns = []
+    for arg in args:
+        if arg in _BATCH_GENERATORS:
+            columns.append(_BATCH_GENERATORS[arg](n))
+        else:
+            gen = _GENERATORS[arg]
+            columns.append([next(gen) for i in range(n)])
+    return [list(row) for row in zip(*columns)]
+
+# finite sorts also list their whole domain - label them with add_domain
+_DOMAINS = {}
+
+def add_domain(key):
+    def deco(f):
+        _DOMAINS[key] = f()
+        return f
+    return deco
+
+# the domains of a function's inputs, or None if any sort is unbounded
+def input_space(sorts):
+    if all(sort in _DOMAINS for sort in sorts):
+        return [_DOMAINS[sort] for sort in sorts]
+    return None
+
+def space_size(domains):
+    size = 1
+    for d in domains:
+        size *= len(d)
+    return size
+
+# every (benchmark, function) pair draws from its own seeded stream, so the
+# rows written never depend on how the work is spread over processes
+def stream_seed(seed, benchmark, name):
+    return crc32("{}:{}:{}".format(seed, benchmark, name).encode())
+
+def seed_streams(s):
+    from numpy import random as np_random
+    random.seed(s)
+    np_random.seed(s)
+
+# turns the unhashable values generators produce into hashable keys - dicts
+# keep their insertion order, as it shows up in the written facts
+def canonical(value):
+    if isinstance(value, dict):
+        return ('dict', tuple((canonical(k), canonical(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return ('set', frozenset(canonical(v) for v in value))
+    if isinstance(value, list):
+        return ('list', tuple(canonical(v) for v in value))
+    if isinstance(value, tuple):
+        return ('tuple', tuple(canonical(v) for v in value))
+    return (type(value).__name__, value)
+
 # machinery for loading annotated functions from a file
 class Function(object):
     def __init__(self, f):
@@ -24,44 +101,439 @@ class Function(object):
         params = signature(f).parameters
         self.inputs = [params[p].annotation for p in list(params)]
         self.name = self._function.__name__
+        self._call = f
+        self._memo = OrderedDict()
+        self._memo_size = 0
+        self.hits = 0
+        self.calls = 0
+    # keep the results of the last size distinct calls - 0 turns it off
+    def memoize(self, size):
+        self._memo_size = size
+        self._memo.clear()
+    # route every evaluation through a sandbox (or anything callable)
+    def isolate(self, sandbox):
+        self._call = sandbox
     def __call__(self, *args):
-        return self._function(*args)
+        self.calls += 1
+        if not self._memo_size:
+            return self._call(*args)
+        try:
+            key = canonical(args)
+            raised, result = self._memo[key]
+        except TypeError:
+            return self._call(*args)
+        except KeyError:
+            # exceptions are remembered too, so repeated bad inputs stay cheap
+            try:
+                raised, result = False, self._call(*args)
+            except Exception as e:
+                raised, result = True, e
+            self._memo[key] = (raised, result)
+            if len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        else:
+            self.hits += 1
+            self._memo.move_to_end(key)
+        if raised:
+            raise result
+        return result
+
+# isolated evaluation - a sandbox runs one function in a child process and
+# waits at most timeout seconds per call, replacing the child when it hangs
+# or dies so a single bad input cannot stall a whole run
+class EvaluationError(Exception):
+    pass
+
+class EvaluationTimeout(EvaluationError):
+    pass
+
+def _sandbox_main(conn, path, name):
+    f = next(g for g in load_functions(path) if g.name == name)
+    while True:
+        args = conn.recv()
+        if args is None:
+            break
+        try:
+            result = ('ok', f(*args))
+        except Exception as e:
+            result = ('error', repr(e))
+        try:
+            conn.send(result)
+        except (PicklingError, TypeError, AttributeError):
+            conn.send(('ok', str(result[1])))
+
+class Sandbox(object):
+    def __init__(self, path, name, timeout):
+        self._path = path
+        self._name = name
+        self._timeout = timeout
+        self.restarts = 0
+        self._start()
+    def _start(self):
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_sandbox_main,
+            args=(child, self._path, self._name), daemon=True)
+        self._process.start()
+        child.close()
+    def _restart(self):
+        self._process.terminate()
+        self._process.join()
+        self._conn.close()
+        self.restarts += 1
+        self._start()
+    def __call__(self, *args):
+        self._conn.send(args)
+        if not self._conn.poll(self._timeout):
+            self._restart()
+            raise EvaluationTimeout("{} timed out after {}s".format(self._name, self._timeout))
+        try:
+            status, result = self._conn.recv()
+        except EOFError:
+            self._restart()
+            raise EvaluationError("{} crashed".format(self._name))
+        if status == 'error':
+            raise EvaluationError(result)
+        return result
+    def close(self):
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(self._timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+
+# modules are cached per process, so pool workers load each benchmark once
+_MODULES = {}
 
 def load_functions(path):
-    module = machinery.SourceFileLoader('sig', path).load_module()
+    if path not in _MODULES:
+        loader = machinery.SourceFileLoader('sig{}'.format(len(_MODULES)), path)
+        _MODULES[path] = loader.load_module()
+    module = _MODULES[path]
     functions = []
     for name in filter(lambda s: "__" not in s, dir(module)):
         functions.append(Function(getattr(module, name)))
     return functions
 
+def benchmark_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def fact_dir(path, args):
+    return os.path.join(os.getcwd(), args.output.format(benchmark=benchmark_name(path)))
+
+# the fact cache - every facts folder keeps a manifest mapping each function
+# to the key its file was generated with, and matching keys are skipped
+MANIFEST = "manifest.json"
+
+def load_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(folder, manifest):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+# the key covers the function, the module's private helpers, the generators
+# for its sorts and every option that changes the rows written
+def fact_key(path, f, args, mode, count):
+    module = _MODULES[path]
+    sources = [getsource(f._function)]
+    for name in sorted(dir(module)):
+        helper = getattr(module, name)
+        if name.startswith("__") and not name.endswith("__") and isfunction(helper):
+            sources.append(getsource(helper))
+    for sort in f.inputs:
+        if sort in _GENERATORS:
+            sources.append(getsource(_GENERATORS[sort].gi_code))
+        if sort in _BATCH_GENERATORS:
+            sources.append(getsource(_BATCH_GENERATORS[sort]))
+        if sort in _DOMAINS and mode != "sample":
+            sources.append(repr(_DOMAINS[sort]))
+    options = [mode, count, args.seed, args.chunk, args.delimiter, args.error, args.timeout,
+               args.adaptive]
+    sources.append(repr(options))
+    return hashlib.sha256("\n".join(sources).encode()).hexdigest()
+
+def count_rows(filename):
+    with open(filename) as f:
+        return sum(1 for line in f)
+
+# decides how the inputs for f are chosen - returns the mode and the row count
+#   enumerate: every input tuple once, when the space is at most --exhaustive
+#   stratify: --count distinct tuples, one from each slice of the space
+#   sample: --count draws from the generators
+def plan(f, args):
+    domains = input_space(f.inputs)
+    if domains is None:
+        return "sample", args.count
+    size = space_size(domains)
+    if size <= max(args.exhaustive, args.count if args.stratify else 0):
+        return "enumerate", size
+    if args.stratify:
+        return "stratify", args.count
+    return "sample", args.count
+
+def input_rows(f, args):
+    mode, count = plan(f, args)
+    if mode == "enumerate":
+        for row in product(*input_space(f.inputs)):
+            yield deepcopy(list(row))
+    elif mode == "stratify":
+        from numpy import linspace, random, unravel_index
+        domains = input_space(f.inputs)
+        bounds = linspace(0, space_size(domains), count + 1).astype(int)
+        indices = random.randint(bounds[:-1], bounds[1:])
+        columns = unravel_index(indices, [len(d) for d in domains])
+        for row in zip(*(c.tolist() for c in columns)):
+            yield [deepcopy(d[i]) for d, i in zip(domains, row)]
+    else:
+        for i in range(0, count, args.chunk):
+            # always draw whole chunks, so a shorter run is a prefix of a longer one
+            yield from generate_batch(args.chunk, *f.inputs)[:count - i]
+
+# adaptive row counts - a row is new if it is a distinct input/output tuple or
+# brings a value no earlier row had in that sort, and a run ends once window
+# rows in a row bring nothing new
+class Coverage(object):
+    def __init__(self, sorts, window):
+        self._sorts = sorts
+        self._window = window
+        self._rows = set()
+        self._values = dict((sort, set()) for sort in sorts)
+        self._stale = 0
+    def add(self, row):
+        cells = tuple(map(str, row))
+        new = cells not in self._rows
+        self._rows.add(cells)
+        for sort, cell in zip(self._sorts, cells):
+            if cell not in self._values[sort]:
+                self._values[sort].add(cell)
+                new = True
+        self._stale = 0 if new else self._stale + 1
+    def saturated(self):
+        return self._window > 0 and self._stale >= self._window
+
+# profiling - wall and cpu time spent in each phase of writing one fact file
+# cpu time is this process only, so sandboxed evaluations show up as wall time
+PHASES = ["generate", "evaluate", "error", "write"]
+
+class Profile(object):
+    def __init__(self):
+        self.wall = dict.fromkeys(PHASES, 0.0)
+        self.cpu = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self._phase = None
+    def start(self, phase):
+        self._phase = phase
+        self._wall = perf_counter()
+        self._cpu = process_time()
+    def stop(self):
+        self.wall[self._phase] += perf_counter() - self._wall
+        self.cpu[self._phase] += process_time() - self._cpu
+        self.calls[self._phase] += 1
+    def summary(self):
+        return {"wall": self.wall, "cpu": self.cpu, "calls": self.calls}
+
+# stands in when --profile is off, so the timing calls cost next to nothing
+class NoProfile(object):
+    def start(self, phase):
+        pass
+    def stop(self):
+        pass
+    def summary(self):
+        return None
+
+def timed(profile, phase, rows):
+    rows = iter(rows)
+    while True:
+        profile.start(phase)
+        row = next(rows, None)
+        profile.stop()
+        if row is None:
+            return
+        yield row
+
+def print_profile(reports):
+    header = ["function", "rows", "rows/s", "errors"] + PHASES + ["cpu"]
+    print("\t".join(header))
+    for report in reports:
+        p = report["profile"]
+        wall = sum(p["wall"].values())
+        line = ["{}.{}".format(report["benchmark"], report["function"]), str(report["rows"]),
+                "{:.0f}".format(report["rows"] / wall if wall else 0),
+                "{:.1%}".format(report["errors"] / report["rows"] if report["rows"] else 0)]
+        line += ["{:.3f}".format(p["wall"][phase]) for phase in PHASES]
+        line += ["{:.3f}".format(sum(p["cpu"].values()))]
+        print("\t".join(line))
+
+# writes the fact file for a single function - task is a (path, name, start)
+# triple, and the first start rows are drawn but already on disk
+def write_facts(task, args):
+    path, name, start = task
+    f = next(g for g in load_functions(path) if g.name == name)
+    f.memoize(args.memo)
+    sandbox = None
+    if args.timeout > 0:
+        sandbox = Sandbox(path, name, args.timeout)
+        f.isolate(sandbox)
+    profile = Profile() if args.profile else NoProfile()
+    seed_streams(stream_seed(args.seed, benchmark_name(path), name))
+
+    filename = os.path.join(fact_dir(path, args), "{}.facts".format(f.name))
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'a' if start else 'w', newline='') as csvfile:
+        csvwriter = writer(csvfile, delimiter=args.delimiter)
+        rows = errors = 0
+        coverage = Coverage(f.inputs + ["{}.out".format(name)], args.adaptive)
+        for i, inputs in enumerate(timed(profile, "generate", input_rows(f, args))):
+            if i < start:
+                continue
+            profile.start("evaluate")
+            try:
+                output = f(*inputs)
+                profile.stop()
+            except Exception as e:
+                profile.stop()
+                profile.start("error")
+                if args.verbose:
+                    print(e)
+                output = args.error
+                errors += 1
+                profile.stop()
+            profile.start("write")
+            csvwriter.writerow(inputs + [output])
+            profile.stop()
+            rows += 1
+            coverage.add(inputs + [output])
+            if coverage.saturated():
+                break
+    report = {"benchmark": benchmark_name(path), "function": name,
+              "rows": rows, "errors": errors, "calls": f.calls, "hits": f.hits,
+              "restarts": 0, "profile": profile.summary()}
+    if sandbox:
+        sandbox.close()
+        report["restarts"] = sandbox.restarts
+    return task, report
+
 # entry point - args is the structure provided by argparse
 def main():
     parser = ArgumentParser(prog="epee", description="generating CSV files for Bach")
-    parser.add_argument('functions')
+    parser.add_argument('functions', nargs='+')
     parser.add_argument('-v', '--verbose', action='store_true')
     parser.add_argument('-d', '--delimiter', type=str, default="\t")
     parser.add_argument('-c', '--count', type=int, default=1000)
-    parser.add_argument('-o', '--output', default="output")
+    parser.add_argument('-o', '--output', default="output",
+        help="output folder, '{benchmark}' is replaced by the module name")
     parser.add_argument('-e', '--error', default="")
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('--chunk', type=int, default=1000,
+        help="number of inputs drawn per batch")
+    parser.add_argument('-f', '--force', action='store_true',
+        help="regenerate every function, ignoring the manifests")
+    parser.add_argument('-x', '--extend-to', type=int, default=0,
+        help="grow existing fact files to this many rows, appending only the missing ones")
+    parser.add_argument('--exhaustive', type=int, default=0,
+        help="enumerate every input of functions with at most this many")
+    parser.add_argument('--stratify', action='store_true',
+        help="draw distinct, evenly spread inputs from larger finite spaces")
+    parser.add_argument('-m', '--memo', type=int, default=10000,
+        help="results kept per function for repeated inputs, 0 disables")
+    parser.add_argument('-t', '--timeout', type=float, default=0,
+        help="evaluate in a separate process, giving up on calls after this many seconds")
+    parser.add_argument('-a', '--adaptive', type=int, default=0, metavar="WINDOW",
+        help="stop early once WINDOW rows in a row add no new tuple or value, --count is the cap")
+    parser.add_argument('-p', '--profile', metavar="JSON",
+        help="time each phase per function, print a table and save it here")
+    parser.add_argument('--columnar', action='store_true',
+        help="also keep a memory-mappable columnar copy in <output>/columnar")
     args = parser.parse_args()
+    if args.extend_to:
+        args.count = args.extend_to
 
-    functions = load_functions(os.path.join(os.getcwd(), args.functions))
-
-    for f in functions:
-        out = "{}/{}.facts".format(args.output, f.name)
-        filename = os.path.join(os.getcwd(), out)
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w', newline='') as csvfile:
-            csvwriter = writer(csvfile, delimiter=args.delimiter)
-            for i in range(args.count):
-                inputs = generate(*f.inputs)
-                try:
-                    output = f(*inputs)
-                except Exception as e:
+    # work out which functions are stale
+    tasks = []
+    keys = {}
+    counts = {}
+    manifests = {}
+    for module in args.functions:
+        path = os.path.join(os.getcwd(), module)
+        folder = fact_dir(path, args)
+        manifests[folder] = load_manifest(folder)
+        for f in load_functions(path):
+            mode, counts[(path, f.name)] = plan(f, args)
+            keys[(path, f.name)] = fact_key(path, f, args, mode, counts[(path, f.name)])
+            entry = manifests[folder].get(f.name, {})
+            filename = os.path.join(folder, "{}.facts".format(f.name))
+            present = os.path.exists(filename)
+            if not args.force and present and entry.get("key") == keys[(path, f.name)]:
+                if args.verbose:
+                    print("cached: {}".format(f.name))
+                continue
+            start = 0
+            if args.extend_to and not args.force and present:
+                rows = count_rows(filename)
+                # extending never shrinks a file or redraws the rows it has
+                if rows >= counts[(path, f.name)]:
                     if args.verbose:
-                        print(e)
-                    output = args.error
-                csvwriter.writerow(inputs + [output])
+                        print("long enough: {} ({} rows)".format(f.name, rows))
+                    continue
+                # a shorter file can only be continued if it came from the same stream
+                done = entry.get("count", 0)
+                if mode == "sample" and not args.adaptive and rows == done \
+                        and entry.get("key") == fact_key(path, f, args, mode, done):
+                    start = done
+            tasks.append((path, f.name, start))
+
+    # and record each one as soon as it is done
+    reports = []
+    def finish(task, report):
+        path, name, start = task
+        reports.append(report)
+        folder = fact_dir(path, args)
+        count = start + report["rows"]
+        manifests[folder][name] = {"key": keys[(path, name)], "count": count}
+        save_manifest(folder, manifests[folder])
+        if args.verbose:
+            print("generated: {} ({} new rows)".format(name, count - start))
+            if report["calls"]:
+                print("\tmemo hits: {} of {} ({:.1%})".format(
+                    report["hits"], report["calls"], report["hits"] / report["calls"]))
+            if report["restarts"]:
+                print("\tworkers recycled: {}".format(report["restarts"]))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            for task, report in pool.map(partial(write_facts, args=args), tasks):
+                finish(task, report)
+    else:
+        for task in tasks:
+            finish(*write_facts(task, args))
+
+    if args.profile:
+        print_profile(reports)
+        with open(args.profile, 'w') as f:
+            json.dump(reports, f, indent=4)
+
+    # the columnar copy mirrors whatever text facts the folder now holds
+    if args.columnar:
+        from columnar import to_store
+        changed = set(fact_dir(path, args) for path, name, start in tasks)
+        for module in args.functions:
+            path = os.path.join(os.getcwd(), module)
+            folder = fact_dir(path, args)
+            store = os.path.join(folder, "columnar")
+            if folder in changed or not os.path.exists(store):
+                grammar = os.path.splitext(path)[0] + ".sexp"
+                to_store(folder, store, grammar if os.path.exists(grammar) else None,
+                         args.delimiter)
+                changed.discard(folder)
 
 # GENERATORS
 
@@ -205,6 +677,176 @@ def radian_gen():
     while True:
         yield randint(-10, 10)
 
+# DOMAINS
+# every value the generators above can produce, for sorts small enough to list
+
+# for dict - each key is absent or maps to 0 or 1
+@add_domain('dict')
+def dict_domain():
+    return [{k: v for k, v in enumerate(values) if v is not None}
+            for values in product([None, 0, 1], repeat=3)]
+
+# for finitefield
+@add_domain('fp17')
+def fp_domain():
+    return list(range(0, 199))
+
+# for geometry
+@add_domain('point')
+def point_domain():
+    return [(x, x) for x in range(-1, 2)]
+
+@add_domain('rect')
+def rect_domain():
+    return [(x, x, size) for x in range(-1, 2) for size in range(1, 7)]
+
+@add_domain('posint')
+def posint_domain():
+    return list(range(1, 4))
+
+# for list
+@add_domain('cons_int')
+def consint_domain():
+    return list(range(0, 3))
+
+@add_domain('list')
+def list_domain():
+    return [list(l) for size in range(0, 4) for l in product(range(0, 3), repeat=size)]
+
+# for matrix
+@add_domain('tensor')
+def tensor_domain():
+    return [(x1, x2, y1, y2) for x1 in range(-1, 3) for x2 in range(-1, 2)
+            for y1 in range(-1, 2) for y2 in range(-1, 2)]
+
+# for queue
+@add_domain('queue')
+def queue_domain():
+    return [list(l) for size in range(0, 4) for l in product(range(0, 2), repeat=size)]
+
+# for sets
+@add_domain('set')
+def set_domain():
+    return [set(s) for size in range(0, 4) for s in combinations(range(0, 3), size)]
+
+# for strings
+@add_domain('string')
+def string_domain():
+    return [''.join(s) or "@" for size in range(0, 5) for s in product("1aA", repeat=size)]
+
+# for trig
+@add_domain('arc')
+def arc_domain():
+    return list(range(-10, 11))
+
+@add_domain('radian')
+def radian_domain():
+    return list(range(-10, 11))
+
+# BATCH GENERATORS
+# vectorized versions of the generators above - values go through tolist()
+# so the facts hold python values, not numpy scalars
+
+def _ragged(sizes, values):
+    return [row[:k] for row, k in zip(values.tolist(), sizes.tolist())]
+
+# for dict
+@add_batch_generator('dict')
+def dict_batch(n):
+    from numpy import random
+    sizes = random.randint(0, 4, n)
+    keys = _ragged(sizes, random.randint(0, 3, (n, 3)))
+    values = _ragged(sizes, random.randint(0, 2, (n, 3)))
+    return [dict(zip(k, v)) for k, v in zip(keys, values)]
+
+# for finitefield
+@add_batch_generator('fp17')
+def fp_batch(n):
+    from numpy import random
+    return random.randint(0, 199, n).tolist()
+
+# for geometry
+@add_batch_generator('point')
+def point_batch(n):
+    from numpy import random
+    return [(x, x) for x in random.randint(-1, 2, n).tolist()]
+
+@add_batch_generator('rect')
+def rect_batch(n):
+    from numpy import random
+    xs = random.randint(-1, 2, n).tolist()
+    sizes = random.randint(1, 7, n).tolist()
+    return [(x, x, size) for x, size in zip(xs, sizes)]
+
+@add_batch_generator('int')
+def int_batch(n):
+    from numpy import random
+    return random.normal(0, 2, n).astype(int).tolist()
+
+@add_batch_generator('rad')
+def rad_batch(n):
+    from numpy import random
+    return random.normal(0, 2, n).astype(int).tolist()
+
+@add_batch_generator('posint')
+def posint_batch(n):
+    from numpy import random
+    return random.randint(1, 4, n).tolist()
+
+# for list
+@add_batch_generator('cons_int')
+def consint_batch(n):
+    from numpy import random
+    return random.randint(0, 3, n).tolist()
+
+@add_batch_generator('list')
+def list_batch(n):
+    from numpy import random
+    return _ragged(random.randint(0, 4, n), random.randint(0, 3, (n, 3)))
+
+# for matrix
+@add_batch_generator('tensor')
+def tensor_batch(n):
+    from numpy import random
+    x1 = random.randint(-1, 3, n).tolist()
+    y1 = random.randint(-1, 2, n).tolist()
+    x2 = random.randint(-1, 2, n).tolist()
+    y2 = random.randint(-1, 2, n).tolist()
+    return list(zip(x1, x2, y1, y2))
+
+# for queue
+@add_batch_generator('queue')
+def queue_batch(n):
+    from numpy import random
+    return _ragged(random.randint(0, 4, n), random.randint(0, 2, (n, 3)))
+
+# for sets
+@add_batch_generator('set')
+def set_batch(n):
+    from numpy import random
+    sizes = abs(random.normal(0, 3, n).astype(int))
+    values = random.randint(0, 3, (n, max(sizes.max(), 1)))
+    return [set(row) for row in _ragged(sizes, values)]
+
+# for strings
+@add_batch_generator('string')
+def string_batch(n):
+    from numpy import array, random
+    sizes = random.randint(0, 5, n)
+    chars = array(["1", "a", "A"])[random.randint(0, 3, (n, 4))]
+    return [''.join(row) or "@" for row in _ragged(sizes, chars)]
+
+# for trig
+@add_batch_generator('arc')
+def arc_batch(n):
+    from numpy import random
+    return random.randint(-10, 11, n).tolist()
+
+@add_batch_generator('radian')
+def radian_batch(n):
+    from numpy import random
+    return random.randint(-10, 11, n).tolist()
+
 
 # if called as a standalone, execute as expected
 if __name__ == "__main__":
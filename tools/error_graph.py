@@ -3,82 +3,55 @@ import seaborn as sns
 import numpy as np
 import argparse
 
-DATA = "./fse"
-
-def load_gt(bm):
-    with open("{}/{}_truth.csv".format(DATA, bm), "r") as f:
-        return set(line.split("\t")[0] for line in f.readlines())
-
-def load_data(bm, size, iter):
-    with open("{}/{}_{}_{}.csv".format(DATA, bm, size, iter), "r") as f:
-        data = f.read()
-        return grab_results(data)
+from sweeps import open_store
 
-def grab_results(results):
-    out = []
-    for line in results.split("\n"):
-        if line:
-            try:
-                out.append(line.split("\t")[0])
-            except:
-                pass
-        else:
-            pass
-    return set(out)
+DATA = "./fse"
 
 # HOLD THE DATA
 
 class ErrorFrame(object):
-    def __init__(self, bm, obs, gt):
-        if bm == "sets":
-            self._count = 1564
-        elif bm == "finitefield":
-            self._count = 1262
-        else:
-            raise Exception
-        self._obs = obs
-        self._gt = gt
-    @property
-    def tp(self):
-        return len(self._obs.intersection(self._gt))
-    @property
-    def fp(self):
-        return len(self._obs - self._gt)
-    @property
-    def fn(self):
-        return len(self._gt - self._obs)
-    @property
-    def tn(self):
-        return self._count - (self.tp + self.fp + self.fn)
+    def __init__(self, tp, fp, fn, tn):
+        self.tp = tp
+        self.fp = fp
+        self.fn = fn
+        self.tn = tn
+
+# counts for every run of bm at once, as [iter, size] matrices - runs that
+# are missing come out as nan
+def load_matrices(store, bm, sizes, iters, universe=None):
+    c = store.confusion(bm, universe)
+    where = dict(((r.iter, r.size), k) for k, r in enumerate(r for r in store.rows(bm) if not r.truth))
+    index = np.array([[where.get((i, s), -1) for s in sizes] for i in iters])
+    def gather(counts):
+        out = np.full(index.shape, np.nan)
+        out[index >= 0] = np.asarray(counts, dtype=float)[index[index >= 0]]
+        return out
+    return ErrorFrame(*map(gather, c))
+
+SIZES = list(range(25, 525, 25))
 
 # get a bunch of error frames
-def load_sequence(bm, index=1):
-    gt = load_gt(bm)
-    out = []
-    for i in range(25, 525, 25):
-        out.append(ErrorFrame(bm, load_data(bm, i, index), gt))
-    return out
-
-def convert_sequence(s, f):
-    return list(map(f, s))
+def load_sequence(store, bm, index=1, universe=None):
+    m = load_matrices(store, bm, SIZES, [index], universe)
+    return [ErrorFrame(m.tp[0, k], m.fp[0, k], m.fn[0, k], m.tn[0, k]) for k in range(len(SIZES))]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("bm")
+    parser.add_argument("-d", "--data", default=DATA)
+    parser.add_argument("-u", "--universe", type=int, default=None,
+        help="specs a run could report, by default every spec seen for bm")
     args = parser.parse_args()
     bm = args.bm
 
     sns.set_context("paper", font_scale=1.5)
     sns.plt.gcf().subplots_adjust(bottom=0.15)
 
-
-    p_series = []
-    n_series = []
-    for i in range(1, 6):
-        s = load_sequence(bm, i)
-        p_series.append(convert_sequence(s, lambda e: e.fp / (e.fp + e.tp)))
-        n_series.append(convert_sequence(s, lambda e: e.fn / (e.tn + e.fn)))
-    # series = zip(*series)
+    store = open_store(args.data)
+    m = load_matrices(store, bm, SIZES, range(1, 6), args.universe)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_series = m.fp / (m.fp + m.tp)
+        n_series = m.fn / (m.tn + m.fn)
 
     sns.set_style("white")
 
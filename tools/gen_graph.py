@@ -1,19 +1,17 @@
 import argparse
-import csv
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 
+from common import iter_times
+
 class TimeLine(object):
     def __init__(self, filename):
         # go ahead and read all the data from filename
-        self._rows = []
-        with open(filename, newline='') as f:
-            reader = csv.reader(f, delimiter='\t')
-            for row in reader:
-                self._rows.append(row)
+        with open(filename) as f:
+            rows = list(iter_times(f))
         # peel off and convert the relevent info
-        self.time = [float(r[1]) for r in self._rows]
-        self.count = [int(r[2]) for r in self._rows]
+        self.time = [r[0] for r in rows]
+        self.count = [r[1] for r in rows]
         # and get a name
         self.name = filename.split(".")[0]
     def plot(self, **kwargs):
@@ -1,5 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import argparse
+import hashlib
+import json
+import os
+
 from z3 import *
 
+from common import read_results, parse_result
+from specs import dedup, parse_spec, spec_key
+from refute import Model, Refuter, read_tables
+
 d = FiniteDomainSort('D', 2)
 
 x = Const(1, BitVecSort(3))
@@ -106,131 +117,307 @@ def get_vars(f):
     return set(map(lambda x: x.n, get_vars_(fs)))
 
 
-allforms = {}
-
-f = open('specs.out','r')
-
-for l in f:
-    l = l.replace("\n","")
-    lt = l.split("\t")   
-    ln = lt[0].split("|")
-    bi = "b"
-    if "===" in ln[0]:
-        zstr = ln[0].split("===")
-    elif "<==" in ln[0]:
-        bi = "r"
-        zstr = ln[0].split("<==")
-    else:
-        bi = "l"
-        zstr = ln[0].split("==>")
-    
-
-    g = ln[1].replace("=","==")
-    if g == "\n": g = True
-    else: g = eval("And("+g+")")
-
-    zstr[0] = zstr[0].replace("=","==")
-    zstr[1] = zstr[1].replace("=","==")
-    assert(len(zstr) == 2)
-
-    left = "And(" + zstr[0] + ")"
-    left = eval(left)
-    right = "And(" + zstr[1] + ")"
-    right = eval(right)
-    
-    if "True" not in zstr[0] and "True" not in zstr[1]:
-        if len(get_vars(left).intersection(get_vars(right))) == 0: continue
-    
-    if bi == "b":
+# every name a spec can mention, as eval used to look them up
+SYMBOLS = dict((k, v) for k, v in globals().items() if isinstance(v, (ExprRef, FuncDeclRef)))
+
+# ----------------------------------------
+# specs as z3 formulas
+# ----------------------------------------
+# built straight from the parsed spec rather than eval-ing its text. names
+# the declarations above miss are declared on first use, over the same sort,
+# and new variables are quantified along with the rest
+
+def _variable(name):
+    if name not in SYMBOLS:
+        SYMBOLS[name] = Const(name, BitVecSort(3))
+        vs.append(SYMBOLS[name])
+    return SYMBOLS[name]
+
+def _function(name, arity, result=BitVecSort(3)):
+    if name not in SYMBOLS:
+        SYMBOLS[name] = Function(name, *([BitVecSort(3)] * arity + [result]))
+    return SYMBOLS[name]
+
+def _term(term):
+    if isinstance(term, str):
+        return _variable(term)
+    name, args = term
+    return _function(name, len(args))(*map(_term, args))
+
+def _side(roots):
+    return And(*[_term(t) == _variable(v) for t, v in roots]) if roots else BoolVal(True)
+
+def _guard(guard):
+    literals = []
+    for positive, relation, args in guard:
+        literal = _function(relation, len(args), BoolSort())(*map(_variable, args))
+        literals.append(literal if positive else Not(literal))
+    return And(*literals) if literals else BoolVal(True)
+
+# None for specs whose sides share no variables, which say nothing
+def to_formula(formula):
+    spec = parse_spec(formula)
+    left, right = _side(spec.lhs), _side(spec.rhs)
+    if spec.lhs and spec.rhs:
+        if len(get_vars(left).intersection(get_vars(right))) == 0:
+            return None
+    if spec.direction == " === ":
         form = left == right
-    elif bi == "l":
-        form = Implies(left,right)
+    elif spec.direction == " ==> ":
+        form = Implies(left, right)
+    else:
+        form = Implies(right, left)
+    return ForAll(vs, Implies(_guard(spec.guard), form))
+
+# ----------------------------------------
+# implication checks
+# ----------------------------------------
+# one solver per process - the negated target goes in once, and each
+# candidate is pushed on top of it and popped off again. a check that does
+# not prove the implication refutes it, unless z3 ran out of time
+
+SETTINGS = {"auto_config": False, "mbqi": False}
+
+PROVED, REFUTED, TIMEOUT = "proved", "refuted", "timeout"
+
+class Checker(object):
+    def __init__(self, timeout):
+        self._solver = Solver()
+        self._solver.set(**SETTINGS)
+        self._solver.set("timeout", timeout)
+    # (position, status) for the candidates checked against target - all of
+    # them, or up to the first that implies it
+    def implied_by(self, target, candidates, first=False):
+        checked = []
+        self._solver.push()
+        self._solver.add(Not(target))
+        for k, candidate in enumerate(candidates):
+            self._solver.push()
+            self._solver.add(candidate)
+            result = self._solver.check()
+            if result == unsat:
+                status = PROVED
+            elif result == unknown and self._solver.reason_unknown() in ("timeout", "canceled"):
+                status = TIMEOUT
+            else:
+                status = REFUTED
+            self._solver.pop()
+            checked.append((k, status))
+            if first and status == PROVED:
+                break
+        self._solver.pop()
+        return checked
+
+# each worker parses the specs once and keeps them by index
+_forms = []
+_checker = None
+
+def _init(lines, timeout):
+    global _forms, _checker
+    _forms = [to_formula(l.split("\t")[0]) for l in lines]
+    _checker = Checker(timeout)
+
+def _check(task):
+    target, candidates, first = task
+    checked = _checker.implied_by(_forms[target], [_forms[i] for i in candidates], first)
+    return target, [(candidates[k], status) for k, status in checked]
+
+# ----------------------------------------
+# remembering implications
+# ----------------------------------------
+# an append-only log of checks keyed on the canonical forms of both specs and
+# the solver settings, where a later line for a key wins and a torn one is
+# skipped. proofs and refutations stand for good, timeouts only for budgets
+# no bigger than the one that ran out
+
+class ImplicationStore(object):
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self._filename = os.path.join(folder, "implications.jsonl")
+        self._entries = {}
+        try:
+            with open(self._filename) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = (entry["status"], entry["timeout"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+        except OSError:
+            pass
+        self._file = open(self._filename, "a")
+    def key(self, candidate, target):
+        text = json.dumps([candidate, target, SETTINGS], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+    def get(self, key, timeout):
+        status, budget = self._entries.get(key, (None, 0))
+        if status == TIMEOUT and budget < timeout:
+            return None
+        return status
+    def put(self, key, status, timeout):
+        self._entries[key] = (status, timeout)
+        self._file.write(json.dumps({"key": key, "status": status, "timeout": timeout}) + "\n")
+    def flush(self):
+        self._file.flush()
+    def close(self):
+        self._file.close()
+
+# ----------------------------------------
+# reduction
+# ----------------------------------------
+# a spec is kept unless a spec kept before it implies it. specs are taken in
+# windows: each one is checked against everything kept so far, and those that
+# survive against the survivors before them in the window, all in parallel.
+# the second round checks every earlier survivor, not only kept ones, so
+# the same specs are kept as checking them one at a time
+
+def _split(target, candidates, parts, first):
+    size = max(1, -(-len(candidates) // parts))
+    return [(target, candidates[i:i + size], first) for i in range(0, len(candidates), size)]
+
+# refuter, if given, rules out candidates before they reach z3, and store
+# answers the checks it has seen before
+def reduce_specs(lines, jobs=1, timeout=2000, window=0, refuter=None, store=None):
+    _init(lines, timeout)
+    keys = [spec_key(l.split("\t")[0]) for l in lines]
+    order = [i for i, f in enumerate(_forms) if f is not None]
+    window = window or (1 if jobs == 1 else 4 * jobs)
+    pool = None
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs, mp_context=get_context("spawn"),
+                                   initializer=_init, initargs=(lines, timeout))
+    run = pool.map if pool else map
+
+    # the candidates the store knows imply target, and those left to check
+    def lookup(target, kept):
+        kept = refuter.survivors(target, kept) if refuter else kept
+        if not store:
+            return [], kept
+        proved, todo = [], []
+        for c in kept:
+            status = store.get(store.key(keys[c], keys[target]), timeout)
+            if status == PROVED:
+                proved.append(c)
+            elif status is None:
+                todo.append(c)
+        return proved, todo
+
+    # the candidates that imply each target, or at least one if first is set
+    def implied(targets, first):
+        found, tasks = {}, []
+        for j, kept in targets:
+            found[j], todo = lookup(j, kept)
+            if not (first and found[j]):
+                tasks.extend(_split(j, todo, jobs, first))
+        for target, checked in run(_check, tasks):
+            for i, status in checked:
+                if store:
+                    store.put(store.key(keys[i], keys[target]), status, timeout)
+                if status == PROVED:
+                    found[target].append(i)
+        return found
+
+    unique = []
+    try:
+        for start in range(0, len(order), window):
+            block = order[start:start + window]
+            dropped = implied([(j, unique) for j in block], True)
+            survivors = [j for j in block if not dropped[j]]
+            within = implied([(j, survivors[:k]) for k, j in enumerate(survivors)], False)
+            kept = set()
+            for j in survivors:
+                if not kept.intersection(within[j]):
+                    kept.add(j)
+                    unique.append(j)
+            if store:
+                store.flush()
+    finally:
+        if pool:
+            pool.shutdown()
+    return [lines[i] for i in unique]
+
+# ----------------------------------------
+# batch reduction
+# ----------------------------------------
+# one solver holds every spec behind a tracking literal, and its negation
+# behind another. specs go from the most general - smallest, then with the
+# most evidence - to the least, and each is checked by assuming its negation
+# along with the literals of everything kept so far: unsat means the kept
+# specs imply it together, and the core names the ones that were needed.
+# a spec implied only by several others at once goes too, so this can keep
+# fewer specs than the pairwise reduction. the refuter only skips a spec
+# when some model has every kept spec known to hold and the spec falsified,
+# so it never keeps one the kept specs imply. it all runs in one solver, on
+# one core
+
+def reduce_batch(lines, timeout=2000, refuter=None, store=None):
+    _init(lines, timeout)
+    keys = [spec_key(l.split("\t")[0]) for l in lines]
+    results = [parse_result(l) for l in lines]
+    order = sorted((i for i, f in enumerate(_forms) if f is not None),
+                   key=lambda i: (results[i].size, -results[i].positive_evidence, i))
+    solver = Solver()
+    solver.set(**SETTINGS)
+    solver.set("timeout", timeout)
+    holds = dict((i, Bool("holds{}".format(i))) for i in order)
+    fails = dict((i, Bool("fails{}".format(i))) for i in order)
+    tracked = dict((str(b), i) for i, b in holds.items())
+    for i in order:
+        solver.add(Implies(holds[i], _forms[i]), Implies(fails[i], Not(_forms[i])))
+
+    kept = []
+    for j in order:
+        if refuter and refuter.refutes_all(j, kept):
+            kept.append(j)
+            continue
+        if store and any(store.get(store.key(keys[i], keys[j]), timeout) == PROVED for i in kept):
+            continue
+        if solver.check(fails[j], *[holds[i] for i in kept]) != unsat:
+            kept.append(j)
+            continue
+        # a core of one kept spec is a pairwise implication worth keeping
+        core = [tracked[str(b)] for b in solver.unsat_core() if str(b) in tracked]
+        if store and len(core) == 1:
+            store.put(store.key(keys[core[0]], keys[j]), PROVED, timeout)
+    if store:
+        store.flush()
+    return [lines[i] for i in sorted(kept)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="drops specs implied by the ones kept before them")
+    parser.add_argument("specs", nargs="?", default="specs.out")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-t", "--timeout", type=int, default=2000,
+        help="milliseconds z3 gets for each implication")
+    parser.add_argument("-w", "--window", type=int, default=0,
+        help="specs checked together, 4 per job by default")
+    parser.add_argument("-f", "--facts", action="append", default=[],
+        help="fact folder of the benchmark, to refute implications on before z3")
+    parser.add_argument("-n", "--samples", type=int, default=65536,
+        help="most assignments each spec is tested on in every model")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-c", "--cache", default=".reduce_cache",
+        help="folder for remembered implication checks")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("-b", "--batch", action="store_true",
+        help="check each spec against all the kept ones at once in one solver, "
+             "which rules out -j and -w")
+    args = parser.parse_args()
+    if args.batch and (args.jobs > 1 or args.window):
+        parser.error("--batch runs in a single solver and takes no --jobs or --window")
+
+    # specs equal up to renaming need no solver to tell them apart
+    lines = [result.line() for result in dedup(read_results(args.specs))]
+    refuter = None
+    if args.facts:
+        model = Model.from_tables(read_tables(args.facts))
+        refuter = Refuter(model, [l.split("\t")[0] for l in lines], args.samples, args.seed)
+    store = None if args.no_cache else ImplicationStore(args.cache)
+    if args.batch:
+        reduced = reduce_batch(lines, args.timeout, refuter, store)
     else:
-        form = Implies(right,left)
-
-    form = Implies(g,form)
-    allforms[l] = form
-    
-unique = {}
-
-def allunique():
-    uf = []
-    for l in unique:
-        uf = uf + [ForAll(vs,unique[l])]
-
-    return And(*uf)
-
-def conjAll():
-    uf = []
-    for l in allforms:
-        uf = uf + [allforms[l]]
-    
-    return ForAll(vs,And(*uf))
-
-
-def impl(f1,f2):
-    s = Solver()
-    s.set(auto_config=False, mbqi=False)
-    s.set("timeout", 2000)
-
-    f1 = ForAll(vs,f1)
-    f2 = ForAll(vs,f2)
-    a = And(f1,Not(f2))
-
-    s.add(a)
-    if s.check() == unsat:
-        return True
-    
-    return False
-
-
-unique = {}
-for l in allforms:
-    there = False
-    for l2 in unique:
-
-
-        #print "z3 :checking", allforms[l]
-        #print "z3 :   and", unique[u]
-        if impl(unique[l2], allforms[l]):
-            there = True
-            break
-
-    if there: continue
-
-    unique[l] = allforms[l]
-
-for l in  unique: print l
-
-f.close()
-
-
-#s = Solver()
-#s.set(mbqi=False)
-#
-#s.add(conjAll())
-#
-#core = []
-#coremap = {}
-#i = 0
-#for l in allforms:
-#    b = Const('b'+str(i))
-#    i = i +1
-#    core.append(b)
-#    coremap[l] = b
-#    s.add(b == ForAll(vs,allforms[l]))
-#    #s.add(Implies(b,Not(b)))
-#
-#print coremap
-#s.check(core)
-#unsatcore =  s.unsat_core()
-#
-#print "unsat core", unsatcore
-#
-#for l in allforms:
-#    b = coremap[l]
-#    if b in unsatcore:
-#        unique[l] = allforms[l]
-#
-#for l in unique: print l
-#f.close()
+        reduced = reduce_specs(lines, args.jobs, args.timeout, args.window, refuter, store)
+    for l in reduced:
+        print(l)
+    if store:
+        store.close()
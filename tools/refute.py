@@ -0,0 +1,213 @@
+from csv import reader
+import os
+
+from specs import parse_spec
+
+# ----------------------------------------
+# concrete models
+# ----------------------------------------
+# the fact tables of a benchmark interpret every symbol a spec can mention,
+# as partial functions - a term is undefined where no fact covers it. values
+# of every sort share one id space, just as they share one sort in reduce.py
+
+def read_tables(folders, delimiter="\t"):
+    tables = {}
+    for folder in folders:
+        for filename in sorted(os.listdir(folder)):
+            name, ext = os.path.splitext(filename)
+            if ext == ".facts":
+                with open(os.path.join(folder, filename), newline='') as f:
+                    tables.setdefault(name, []).extend(reader(f, delimiter=delimiter))
+    return tables
+
+def _encode(columns, n, length):
+    import numpy as np
+    key = np.zeros(length, dtype=np.int64)
+    for column in columns:
+        key = key * n + column
+    return key
+
+class Model(object):
+    def __init__(self, size, functions, pool):
+        self.size = size
+        # name -> (sorted argument keys, result ids, arity)
+        self.functions = functions
+        # ids of every value seen as an argument, to draw free variables from
+        self.pool = pool
+
+    @classmethod
+    def from_tables(cls, tables):
+        import numpy as np
+        ids = {}
+        for rows in tables.values():
+            for row in rows:
+                for value in row:
+                    ids.setdefault(value, len(ids))
+        functions, pool = {}, set()
+        for name, rows in tables.items():
+            rows = [r for r in rows if r]
+            if not rows:
+                continue
+            arity = len(rows[0]) - 1
+            matrix = np.array([[ids[v] for v in r] for r in rows], dtype=np.int64).reshape(len(rows), arity + 1)
+            keys = _encode(list(matrix[:, :arity].T), len(ids), len(rows))
+            # the first fact for some arguments wins, as in a dict
+            keys, first = np.unique(keys, return_index=True)
+            functions[name] = (keys, matrix[first, arity], arity)
+            pool.update(matrix[:, :arity].ravel().tolist())
+        return cls(len(ids), functions, np.array(sorted(pool), dtype=np.int64))
+
+    # the same model with the results of one function shuffled
+    def scramble(self, name, rng):
+        functions = dict(self.functions)
+        keys, results, arity = functions[name]
+        functions[name] = (keys, rng.permutation(results), arity)
+        return Model(self.size, functions, self.pool)
+
+    # applies a function to columns of argument ids, -1 where undefined
+    def apply(self, name, args, length):
+        import numpy as np
+        keys, results, arity = self.functions[name]
+        undefined = np.zeros(length, dtype=bool)
+        for arg in args:
+            undefined |= arg < 0
+        key = _encode([np.where(undefined, 0, a) for a in args], self.size, length)
+        pos = np.minimum(np.searchsorted(keys, key), len(keys) - 1)
+        found = ~undefined & (keys[pos] == key)
+        return np.where(found, results[pos], -1)
+
+# ----------------------------------------
+# evaluating specs
+# ----------------------------------------
+# a spec is falsified by an assignment where every term is defined, with a
+# value in the pool, and the two sides disagree in the spec's direction.
+# assignments are drawn by running one side forward - the variable of each
+# root is bound to its term, so that side holds and the other one gets
+# tested - and then the same the other way around. the free variables left
+# range over every argument value when there are few enough of them, and are
+# sampled otherwise. either way everything stays in the model whose domain
+# is the pool, and a spec is known to hold there only when nothing falsifies
+# it, the free variables were enumerated and every term was defined under
+# every assignment - extending the partial functions cannot change that
+
+def symbols(spec):
+    found = set()
+    def term(t):
+        if not isinstance(t, str):
+            found.add(t[0])
+            for a in t[1]:
+                term(a)
+    for t, _ in spec.lhs + spec.rhs:
+        term(t)
+    for _, relation, _ in spec.guard:
+        found.add(relation)
+    return found
+
+def _variables(term, out):
+    if isinstance(term, str):
+        out.append(term)
+    else:
+        for a in term[1]:
+            _variables(a, out)
+    return out
+
+def _free(spec, driver):
+    free, bound = [], set()
+    def visit(names):
+        for name in names:
+            if name not in bound:
+                bound.add(name)
+                free.append(name)
+    for t, v in driver:
+        visit(_variables(t, []))
+        bound.add(v)
+    for t, v in spec.lhs + spec.rhs:
+        visit(_variables(t, []) + [v])
+    for _, _, args in spec.guard:
+        visit(args)
+    return free
+
+# assignments to free, how many there are and whether they are all of them
+def _assignments(free, pool, limit, rng):
+    import numpy as np
+    if not free:
+        return {}, 1, True
+    if len(pool) ** len(free) <= limit:
+        grid = np.indices([len(pool)] * len(free)).reshape(len(free), -1)
+        return dict((name, pool[g]) for name, g in zip(free, grid)), grid.shape[1], True
+    return dict((name, rng.choice(pool, limit)) for name in free), limit, False
+
+# whether spec is falsified in model, and whether it is known to hold there
+def evaluate(spec, model, samples, rng):
+    import numpy as np
+    holds = True
+    for driver in (spec.lhs, spec.rhs):
+        binds, n, exhaustive = _assignments(_free(spec, driver), model.pool, samples, rng)
+        defined = np.ones(n, dtype=bool)
+        def value(t):
+            nonlocal defined
+            if isinstance(t, str):
+                return binds[t]
+            result = model.apply(t[0], [value(a) for a in t[1]], n)
+            defined &= np.isin(result, model.pool)
+            return result
+        for t, v in driver:
+            binds.setdefault(v, value(t))
+        def side(roots):
+            holds = np.ones(n, dtype=bool)
+            for t, v in roots:
+                holds &= value(t) == value(v)
+            return holds
+        lhs, rhs = side(spec.lhs), side(spec.rhs)
+        if spec.direction == " === ":
+            violated = lhs != rhs
+        elif spec.direction == " ==> ":
+            violated = lhs & ~rhs
+        else:
+            violated = rhs & ~lhs
+        if (defined & violated).any():
+            return True, False
+        holds = holds and exhaustive and bool(defined.all())
+    return False, holds
+
+# ----------------------------------------
+# refuting implications
+# ----------------------------------------
+# the models are the fact tables and, for every function, the fact tables
+# with that function's results shuffled. a spec that never mentions the
+# shuffled function is falsified or holds in that model just as in the
+# first one. a model where the candidate is known to hold and the target is
+# falsified shows the candidate does not imply the target, without asking z3
+
+class Refuter(object):
+    def __init__(self, model, formulas, samples=65536, seed=0):
+        import numpy as np
+        rng = np.random.default_rng(seed)
+        models = [(None, model)] + [(g, model.scramble(g, rng)) for g in sorted(model.functions)]
+        self.holds = np.zeros((len(formulas), len(models)), dtype=bool)
+        self.falsified = np.zeros((len(formulas), len(models)), dtype=bool)
+        for i, formula in enumerate(formulas):
+            try:
+                spec = parse_spec(formula)
+            except ValueError:
+                continue
+            mentioned = symbols(spec)
+            # guards are left to z3
+            if spec.guard or not mentioned <= set(model.functions):
+                continue
+            for m, (g, mod) in enumerate(models):
+                if g is None or g in mentioned:
+                    self.falsified[i, m], self.holds[i, m] = evaluate(spec, mod, samples, rng)
+                else:
+                    self.falsified[i, m], self.holds[i, m] = self.falsified[i, 0], self.holds[i, 0]
+
+    # the candidates that are not refuted for target
+    def survivors(self, target, candidates):
+        if not candidates:
+            return []
+        refuted = (self.holds[candidates] & self.falsified[target]).any(axis=1)
+        return [c for c, r in zip(candidates, refuted) if not r]
+
+    # whether some model has every kept spec holding and target falsified
+    def refutes_all(self, target, kept):
+        return bool((self.holds[kept].all(axis=0) & self.falsified[target]).any())
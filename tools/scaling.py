@@ -3,6 +3,8 @@ import argparse
 import sys
 import csv
 
+from common import iter_times
+
 def do_it(cmd, seconds):
     try:
          output = check_output(cmd, stderr=STDOUT, timeout=seconds, shell=True)
@@ -24,7 +26,5 @@ if __name__ == '__main__':
 
     with open(args.output, 'w', newline='') as f:
         writer = csv.writer(f)
-        for line in results.split("\n"):
-            if line.startswith("TIME"):
-                l = line.split("\t")
-                writer.writerow([float(l[1]), int(l[2])])
+        for time, count in iter_times(results.split("\n")):
+            writer.writerow([time, count])
@@ -0,0 +1,185 @@
+from itertools import permutations, product, groupby
+from typing import NamedTuple
+import hashlib
+import re
+
+# ----------------------------------------
+# parsing specs
+# ----------------------------------------
+# bach prints a spec as "lhs DIR rhs | guard", where each side is "True" or
+# roots "term = var" joined by ", ", DIR is one of ===, ==> and <==, and the
+# guard is relations "r(v, w)" or "Not(r(v, w))" joined by ", "
+#
+# a term is a variable name or a (symbol, args) pair, a root is a (term, var)
+# pair and a guard literal is a (positive, relation, vars) triple
+
+DIRECTIONS = [" === ", " ==> ", " <== "]
+
+_TOKENS = re.compile(r"[A-Za-z0-9_]+|[(),=]")
+
+class Spec(NamedTuple):
+    lhs: tuple
+    direction: str
+    rhs: tuple
+    guard: tuple
+
+class _Tokens(object):
+    def __init__(self, text):
+        self._tokens = _TOKENS.findall(text)
+        self._pos = 0
+    def peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("unexpected end of spec")
+        self._pos += 1
+        return token
+    def expect(self, token):
+        if self.next() != token:
+            raise ValueError("expected '{}'".format(token))
+    def done(self):
+        return self._pos == len(self._tokens)
+
+def _term(tokens):
+    name = tokens.next()
+    if tokens.peek() != "(":
+        return name
+    tokens.next()
+    args = [_term(tokens)]
+    while tokens.peek() == ",":
+        tokens.next()
+        args.append(_term(tokens))
+    tokens.expect(")")
+    return (name, tuple(args))
+
+def _side(text):
+    if text.strip() == "True":
+        return ()
+    tokens = _Tokens(text)
+    roots = []
+    while True:
+        term = _term(tokens)
+        tokens.expect("=")
+        roots.append((term, tokens.next()))
+        if tokens.done():
+            return tuple(roots)
+        tokens.expect(",")
+
+def _guard(text):
+    tokens = _Tokens(text)
+    literals = []
+    while not tokens.done():
+        positive = True
+        if tokens.peek() == "Not":
+            tokens.next()
+            tokens.expect("(")
+            positive = False
+        relation, args = _term(tokens)
+        if not positive:
+            tokens.expect(")")
+        literals.append((positive, relation, args))
+        if not tokens.done():
+            tokens.expect(",")
+    return tuple(literals)
+
+def parse_spec(formula):
+    body, _, guard = formula.partition("|")
+    for direction in DIRECTIONS:
+        if direction in body:
+            lhs, rhs = body.split(direction)
+            return Spec(_side(lhs), direction, _side(rhs), _guard(guard))
+    raise ValueError("no direction in spec")
+
+# ----------------------------------------
+# printing specs
+# ----------------------------------------
+
+def _term_string(term, rename):
+    if isinstance(term, str):
+        return rename(term)
+    name, args = term
+    return "{}({})".format(name, ", ".join(_term_string(a, rename) for a in args))
+
+def _side_string(roots, rename):
+    if not roots:
+        return "True"
+    return ", ".join("{} = {}".format(_term_string(t, rename), rename(v)) for t, v in roots)
+
+def _guard_string(guard, rename):
+    out = []
+    for positive, relation, args in guard:
+        rel = "{}({})".format(relation, ", ".join(rename(a) for a in args))
+        out.append(rel if positive else "Not({})".format(rel))
+    return ", ".join(out)
+
+def spec_string(spec, rename=lambda v: v):
+    body = _side_string(spec.lhs, rename) + spec.direction + _side_string(spec.rhs, rename)
+    return body + " | " + _guard_string(spec.guard, rename)
+
+# ----------------------------------------
+# canonical forms
+# ----------------------------------------
+# two specs are the same if one becomes the other by renaming variables,
+# reordering the roots of a side or the guard literals, swapping the sides
+# of === or turning <== around into ==>. the canonical form is the smallest
+# rendering, with variables named by first use, over all those rewrites;
+# only items that look alike once variables are erased are ever permuted
+
+def _shape(item):
+    erase = lambda v: "_"
+    if len(item) == 2:
+        return _side_string((item,), erase)
+    return _guard_string((item,), erase)
+
+def _orderings(items):
+    items = sorted(items, key=_shape)
+    groups = [list(g) for _, g in groupby(items, key=_shape)]
+    for choice in product(*(permutations(g) for g in groups)):
+        yield tuple(item for group in choice for item in group)
+
+def _renamer():
+    names = {}
+    def rename(v):
+        if v not in names:
+            names[v] = "v{}".format(len(names))
+        return names[v]
+    return rename
+
+def canonical_string(spec):
+    if spec.direction == " <== ":
+        spec = Spec(spec.rhs, " ==> ", spec.lhs, spec.guard)
+    orientations = [spec]
+    if spec.direction == " === ":
+        orientations.append(Spec(spec.rhs, spec.direction, spec.lhs, spec.guard))
+    best = None
+    for s in orientations:
+        for lhs, rhs, guard in product(_orderings(s.lhs), _orderings(s.rhs), _orderings(s.guard)):
+            text = spec_string(Spec(lhs, s.direction, rhs, guard), _renamer())
+            if best is None or text < best:
+                best = text
+    return best
+
+# the canonical text of a formula, or the formula itself if it does not parse
+def spec_key(formula):
+    try:
+        return canonical_string(parse_spec(formula))
+    except ValueError:
+        return formula.strip()
+
+def spec_hash(formula):
+    return hashlib.sha1(spec_key(formula).encode()).hexdigest()
+
+# which of two results for the same spec to keep - the most positive
+# evidence, ties going to the first line in sort order
+def rank(result):
+    return (-result.positive_evidence, result.line())
+
+# collapses results that are the same spec down to the best ranked one
+def dedup(results):
+    best = {}
+    for result in results:
+        key = spec_key(result.formula)
+        if key not in best or rank(result) < rank(best[key]):
+            best[key] = result
+    return list(best.values())
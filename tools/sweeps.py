@@ -0,0 +1,141 @@
+from typing import NamedTuple
+import json
+import os
+import re
+
+from common import read_formulas, find_runs
+from specs import spec_key
+
+# ----------------------------------------
+# an index over sweep results
+# ----------------------------------------
+# every spec in a folder of sweep results (fse_test.sh's <bm>_<size>_<iter>.csv
+# and fse_truth.sh's <bm>_truth.csv) is interned by its canonical form, and
+# every file becomes a row of a bit matrix with a bit per spec id
+#   index.json    the spec of every id, and a row per file with its stamp
+#   bits.npy      uint8 rows x ceil(specs / 8), bits packed big end first
+# ingesting only rereads files whose size or mtime changed, and the matrix
+# is loaded with mmap
+
+_TRUTH = re.compile(r"^(?P<bm>.+)_truth\.csv$")
+
+class Row(NamedTuple):
+    filename: str
+    bm: str
+    size: int
+    iter: int
+    truth: bool
+
+def sweep_files(folder):
+    rows = [Row(os.path.basename(r.filename), r.bm, r.size, r.iter, False)
+            for r in find_runs(folder)]
+    for name in sorted(os.listdir(folder)):
+        match = _TRUTH.match(name)
+        if match:
+            rows.append(Row(name, match.group("bm"), 0, 0, True))
+    return rows
+
+def _stamp(filename):
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+class SweepStore(object):
+    def __init__(self, folder):
+        self._folder = folder
+        try:
+            with open(os.path.join(folder, "index.json")) as f:
+                index = json.load(f)
+            self._specs = index["specs"]
+            self._rows = [Row(*r) for r in index["rows"]]
+            self._stamps = index["stamps"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self._specs, self._rows, self._stamps = [], [], []
+        self._bits = None
+
+    @property
+    def bits(self):
+        import numpy as np
+        if self._bits is None:
+            filename = os.path.join(self._folder, "bits.npy")
+            if self._rows and os.path.exists(filename):
+                self._bits = np.load(filename, mmap_mode='r')
+            else:
+                self._bits = np.zeros((len(self._rows), 0), dtype=np.uint8)
+        return self._bits
+
+    def specs(self):
+        return list(self._specs)
+
+    def rows(self, bm=None):
+        return [r for r in self._rows if bm is None or r.bm == bm]
+
+    # rereads new and changed files from data, returning how many it read
+    def ingest(self, data):
+        import numpy as np
+        ids = dict((s, i) for i, s in enumerate(self._specs))
+        old = dict((r.filename, (r, stamp, i)) for i, (r, stamp) in enumerate(zip(self._rows, self._stamps)))
+        rows, stamps, members, read = [], [], [], 0
+        for row in sweep_files(data):
+            stamp = _stamp(os.path.join(data, row.filename))
+            if row.filename in old and old[row.filename][1] == stamp:
+                i = old[row.filename][2]
+                members.append(np.flatnonzero(np.unpackbits(self.bits[i])[:len(self._specs)]))
+            else:
+                keys = set(map(spec_key, read_formulas(os.path.join(data, row.filename))))
+                members.append(np.array([ids.setdefault(k, len(ids)) for k in sorted(keys)], dtype=np.int64))
+                read += 1
+            rows.append(row)
+            stamps.append(stamp)
+        if not read and len(rows) == len(self._rows):
+            return 0
+
+        self._specs = [None] * len(ids)
+        for s, i in ids.items():
+            self._specs[i] = s
+        matrix = np.zeros((len(rows), len(ids)), dtype=bool)
+        for i, m in enumerate(members):
+            matrix[i, m] = True
+        self._rows, self._stamps = rows, stamps
+        # write then rename, so a reader never maps half a matrix
+        os.makedirs(self._folder, exist_ok=True)
+        self._bits = None
+        temp = os.path.join(self._folder, "bits.{}.npy".format(os.getpid()))
+        np.save(temp, np.packbits(matrix, axis=1))
+        os.replace(temp, os.path.join(self._folder, "bits.npy"))
+        with open(os.path.join(self._folder, "index.json.{}".format(os.getpid())), "w") as f:
+            json.dump({"specs": self._specs, "rows": [list(r) for r in rows], "stamps": stamps}, f)
+        os.replace(os.path.join(self._folder, "index.json.{}".format(os.getpid())),
+                   os.path.join(self._folder, "index.json"))
+        return read
+
+    # tp, fp, fn and tn of every run of bm against its truth, as arrays in
+    # the order of runs(bm). tn counts the specs of the universe in neither,
+    # which unless given is every spec seen in the benchmark's files
+    def confusion(self, bm, universe=None):
+        import numpy as np
+        runs = [i for i, r in enumerate(self._rows) if r.bm == bm and not r.truth]
+        truth = [i for i, r in enumerate(self._rows) if r.bm == bm and r.truth]
+        bits = np.asarray(self.bits)
+        width = bits.shape[1]
+        observed = bits[runs] if runs else np.zeros((0, width), dtype=np.uint8)
+        gt = bits[truth[0]] if truth else np.zeros(width, dtype=np.uint8)
+        if universe is None:
+            universe = int(np.unpackbits(np.bitwise_or.reduce(bits[runs + truth], axis=0)).sum()) \
+                if runs or truth else 0
+        def count(m):
+            return np.unpackbits(m, axis=-1).sum(axis=-1).astype(np.int64)
+        tp = count(observed & gt)
+        fp = count(observed & ~gt)
+        fn = count(~observed & gt)
+        return Confusion(tp, fp, fn, universe - (tp + fp + fn))
+
+class Confusion(NamedTuple):
+    tp: object
+    fp: object
+    fn: object
+    tn: object
+
+def open_store(data, folder=None):
+    store = SweepStore(folder or os.path.join(data, ".index"))
+    store.ingest(data)
+    return store
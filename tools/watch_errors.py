@@ -0,0 +1,128 @@
+from time import sleep, time
+import argparse
+import json
+import os
+
+import numpy as np
+
+from sweeps import SweepStore
+
+DATA = "./fse"
+
+# ----------------------------------------
+# per-size error statistics
+# ----------------------------------------
+# a run counts once its file has sat unchanged for settle seconds, as
+# fse_test.sh tees into it while bach is still going. a size has converged
+# once it has min_runs runs and the standard errors of both its error rates
+# are within tolerance
+
+def _number(x):
+    x = float(x)
+    return None if np.isnan(x) else round(x, 6)
+
+def _mean_se(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return np.nan, np.nan
+    se = values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else np.nan
+    return values.mean(), se
+
+def size_stats(store, data, bm, settle=0, universe=None, tolerance=0.02, min_runs=3):
+    runs = [r for r in store.rows(bm) if not r.truth]
+    c = store.confusion(bm, universe)
+    now = time()
+    def settled(r):
+        try:
+            return now - os.stat(os.path.join(data, r.filename)).st_mtime >= settle
+        except OSError:
+            return False
+    done = np.array([settled(r) for r in runs], dtype=bool)
+    sizes = np.array([r.size for r in runs])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        positive = c.fp / (c.fp + c.tp)
+        negative = c.fn / (c.tn + c.fn)
+    out = {}
+    for size in sorted(set(sizes.tolist())):
+        sel = (sizes == size) & done
+        p, p_se = _mean_se(positive[sel])
+        n, n_se = _mean_se(negative[sel])
+        count = int(sel.sum())
+        out[str(size)] = {
+            "runs": count,
+            "pending": int(((sizes == size) & ~done).sum()),
+            "tp": _number(c.tp[sel].mean()) if count else None,
+            "fp": _number(c.fp[sel].mean()) if count else None,
+            "fn": _number(c.fn[sel].mean()) if count else None,
+            "positive": _number(p), "positive_se": _number(p_se),
+            "negative": _number(n), "negative_se": _number(n_se),
+            "converged": bool(count >= min_runs and p_se <= tolerance and n_se <= tolerance),
+        }
+    return out
+
+# a benchmark is reported once it has a truth file and a run, or as soon as
+# it is named in benchmarks, so a sweep that has not started yet holds off
+# --until-converged
+def snapshot(store, data, args):
+    status = {"time": time(), "files": len(store.rows()), "benchmarks": {}}
+    names = args.benchmarks or sorted(set(r.bm for r in store.rows()))
+    for bm in names:
+        rows = store.rows(bm)
+        if not args.benchmarks and not (any(r.truth for r in rows) and any(not r.truth for r in rows)):
+            continue
+        sizes = size_stats(store, data, bm, args.settle, args.universe, args.tolerance, args.min_runs)
+        status["benchmarks"][bm] = {
+            "converged": bool(sizes) and all(s["converged"] for s in sizes.values()),
+            "sizes": sizes,
+        }
+    return status
+
+def write_status(filename, status):
+    # write then rename, so a reader never sees half a snapshot
+    temp = "{}.{}".format(filename, os.getpid())
+    with open(temp, "w") as f:
+        json.dump(status, f, indent=4, sort_keys=True)
+    os.replace(temp, filename)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="follows a sweep and reports error rates per size")
+    parser.add_argument("benchmarks", nargs="*",
+        help="benchmarks to follow, every one with a truth file and runs by default")
+    parser.add_argument("-d", "--data", default=DATA)
+    parser.add_argument("-i", "--index", default=None,
+        help="folder for the spec index, <data>/.index by default")
+    parser.add_argument("-o", "--output", default=None,
+        help="status snapshot, <data>/status.json by default")
+    parser.add_argument("-p", "--poll", type=float, default=10,
+        help="seconds between looks at the data")
+    parser.add_argument("-s", "--settle", type=float, default=30,
+        help="seconds a file must sit unchanged before its run counts")
+    parser.add_argument("-u", "--universe", type=int, default=None)
+    parser.add_argument("-t", "--tolerance", type=float, default=0.02,
+        help="largest standard error of a converged error rate")
+    parser.add_argument("-m", "--min-runs", type=int, default=3)
+    parser.add_argument("--once", action="store_true", help="look once and stop")
+    parser.add_argument("--until-converged", action="store_true",
+        help="stop once every benchmark has converged")
+    args = parser.parse_args()
+
+    store = SweepStore(args.index or os.path.join(args.data, ".index"))
+    output = args.output or os.path.join(args.data, "status.json")
+    last = None
+    while True:
+        store.ingest(args.data)
+        status = snapshot(store, args.data, args)
+        # only a change in the statistics is worth a new snapshot
+        summary = json.dumps(status["benchmarks"], sort_keys=True)
+        if summary != last:
+            write_status(output, status)
+            last = summary
+            for bm, b in status["benchmarks"].items():
+                runs = sum(s["runs"] for s in b["sizes"].values())
+                converged = sum(s["converged"] for s in b["sizes"].values())
+                print("{}\t{} runs\t{}/{} sizes converged".format(bm, runs, converged, len(b["sizes"])),
+                      flush=True)
+        done = status["benchmarks"] and all(b["converged"] for b in status["benchmarks"].values())
+        if args.once or (args.until_converged and done):
+            break
+        sleep(args.poll)